@@ -17,28 +17,171 @@ class FirebaseSettings(BaseSettings):
     messagingsenderid: str = Field(default=os.getenv("FIREBASE_MESSAGINGSENDERID", ""))
     appid: str = Field(default=os.getenv("FIREBASE_APPID", ""))
     measurementid: str = Field(default=os.getenv("FIREBASE_MEASUREMENTID", ""))
+    # Identity Toolkit REST API; override to load-test against a local stub
+    auth_base_url: str = Field(default=os.getenv("FIREBASE_AUTH_BASE_URL", "https://identitytoolkit.googleapis.com/v1/accounts"))
       
     class Config:
         env_prefix = "FIREBASE_"
 
+class AuthSettings(BaseSettings):
+    # Verified ID tokens are cached until their `exp`, capped at this many seconds
+    token_cache_size: int = Field(default=int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000")))
+    token_cache_max_ttl: float = Field(default=float(os.getenv("AUTH_TOKEN_CACHE_MAX_TTL", "3600")))
+    # Tokens are verified locally against signing keys kept in memory; point
+    # the URL at a local JWKS stand-in for testing
+    local_verification: bool = Field(default=os.getenv("AUTH_LOCAL_VERIFICATION", "True").lower() == "true")
+    signing_keys_url: str = Field(default=os.getenv("AUTH_SIGNING_KEYS_URL", "https://www.googleapis.com/service_accounts/v1/jwk/securetoken@system.gserviceaccount.com"))
+    signing_keys_refresh_margin: float = Field(default=float(os.getenv("AUTH_SIGNING_KEYS_REFRESH_MARGIN", "300")))
+    signing_keys_min_refresh_interval: float = Field(default=float(os.getenv("AUTH_SIGNING_KEYS_MIN_REFRESH_INTERVAL", "60")))
+    signing_keys_fetch_timeout: float = Field(default=float(os.getenv("AUTH_SIGNING_KEYS_FETCH_TIMEOUT", "10")))
+    clock_skew: int = Field(default=int(os.getenv("AUTH_CLOCK_SKEW", "0")))
+    # Profiles are cached per worker and in Redis; updates are broadcast on the channel
+    profile_cache_size: int = Field(default=int(os.getenv("AUTH_PROFILE_CACHE_SIZE", "10000")))
+    profile_cache_ttl: float = Field(default=float(os.getenv("AUTH_PROFILE_CACHE_TTL", "60")))
+    profile_cache_redis_ttl: int = Field(default=int(os.getenv("AUTH_PROFILE_CACHE_REDIS_TTL", "600")))
+    profile_invalidation_channel: str = Field(default=os.getenv("AUTH_PROFILE_INVALIDATION_CHANNEL", "profile_invalidations"))
+    profile_resubscribe_delay: float = Field(default=float(os.getenv("AUTH_PROFILE_RESUBSCRIBE_DELAY", "1.0")))
+    
+    class Config:
+        env_prefix = "AUTH_"
+
 class LLMSettings(BaseSettings): 
     model: str = Field(default=os.getenv("LLM_MODEL"))
     endpoint: str = Field(default=os.getenv("LLM_ENDPOINT", "https://models.github.ai/inference"))
     token: str = Field(default=os.getenv("LLM_TOKEN"))
     temperature: float = Field(default=float(os.getenv("LLM_TEMPERATURE", "1.0")))
+    # HTTP connection pool shared by every model client in the process
+    max_connections: int = Field(default=int(os.getenv("LLM_MAX_CONNECTIONS", "20")))
+    max_keepalive_connections: int = Field(default=int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "10")))
+    keepalive_expiry: float = Field(default=float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60.0")))
+    connect_timeout: float = Field(default=float(os.getenv("LLM_CONNECT_TIMEOUT", "10.0")))
+    request_timeout: float = Field(default=float(os.getenv("LLM_REQUEST_TIMEOUT", "120.0")))
+    max_retries: int = Field(default=int(os.getenv("LLM_MAX_RETRIES", "2")))
+    # Upper bound on concurrent requests to the endpoint; extra calls wait
+    max_in_flight: int = Field(default=int(os.getenv("LLM_MAX_IN_FLIGHT", "16")))
     
     class Config:
         env_prefix = "LLM_"
 
+class ChatSettings(BaseSettings):
+    # Most recent history kept verbatim in the prompt; older turns are folded
+    # into a rolling summary once at least `history_fold_min_tokens` are waiting
+    history_token_budget: int = Field(default=int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "2000")))
+    history_fold_min_tokens: int = Field(default=int(os.getenv("CHAT_HISTORY_FOLD_MIN_TOKENS", "200")))
+    # Messages fetched per query while filling the history window
+    history_page_size: int = Field(default=int(os.getenv("CHAT_HISTORY_PAGE_SIZE", "20")))
+    # Write-behind persistence of chat turns. Only safe with a single worker
+    # (or sticky sessions); otherwise turns are written before the response
+    write_behind: bool = Field(default=os.getenv("CHAT_WRITE_BEHIND", "False").lower() == "true")
+    write_flush_interval: float = Field(default=float(os.getenv("CHAT_WRITE_FLUSH_INTERVAL", "0.05")))
+    write_max_pending: int = Field(default=int(os.getenv("CHAT_WRITE_MAX_PENDING", "1000")))
+    write_max_batch: int = Field(default=int(os.getenv("CHAT_WRITE_MAX_BATCH", "50")))
+    # Sessions remembered per worker as known to exist. The TTL is fixed, not
+    # idle, and bounds how long another worker's delete can go unnoticed here
+    session_cache_size: int = Field(default=int(os.getenv("CHAT_SESSION_CACHE_SIZE", "10000")))
+    session_cache_ttl: float = Field(default=float(os.getenv("CHAT_SESSION_CACHE_TTL", "5")))
+    # Seconds an unused session stays in the Redis session registry
+    session_registry_ttl: int = Field(default=int(os.getenv("CHAT_SESSION_REGISTRY_TTL", str(7 * 24 * 3600))))
+    # Pagination of the session list and of a session's messages
+    sessions_page_size: int = Field(default=int(os.getenv("CHAT_SESSIONS_PAGE_SIZE", "20")))
+    messages_page_size: int = Field(default=int(os.getenv("CHAT_MESSAGES_PAGE_SIZE", "50")))
+    max_page_size: int = Field(default=int(os.getenv("CHAT_MAX_PAGE_SIZE", "100")))
+    # Most sessions a single bulk delete request may name
+    max_bulk_delete: int = Field(default=int(os.getenv("CHAT_MAX_BULK_DELETE", "100")))
+    # History windows kept between turns, per worker and optionally in Redis
+    history_cache_size: int = Field(default=int(os.getenv("CHAT_HISTORY_CACHE_SIZE", "2000")))
+    history_cache_idle_ttl: float = Field(default=float(os.getenv("CHAT_HISTORY_CACHE_IDLE_TTL", "900")))
+    history_cache_redis: bool = Field(default=os.getenv("CHAT_HISTORY_CACHE_REDIS", "False").lower() == "true")
+    history_cache_redis_ttl: int = Field(default=int(os.getenv("CHAT_HISTORY_CACHE_REDIS_TTL", "3600")))
+    
+    class Config:
+        env_prefix = "CHAT_"
+
+class SummarizerSettings(BaseSettings):
+    chunk_size: int = Field(default=int(os.getenv("SUMMARIZER_CHUNK_SIZE", "1000")))
+    chunk_overlap: int = Field(default=int(os.getenv("SUMMARIZER_CHUNK_OVERLAP", "100")))
+    # Map summaries are collapsed in groups until they fit this many tokens
+    reduce_token_max: int = Field(default=int(os.getenv("SUMMARIZER_REDUCE_TOKEN_MAX", "3000")))
+    # Adaptive scheduling of the map step's LLM calls
+    map_max_concurrency: int = Field(default=int(os.getenv("SUMMARIZER_MAP_MAX_CONCURRENCY", "8")))
+    map_min_concurrency: int = Field(default=int(os.getenv("SUMMARIZER_MAP_MIN_CONCURRENCY", "1")))
+    map_max_retries: int = Field(default=int(os.getenv("SUMMARIZER_MAP_MAX_RETRIES", "4")))
+    map_backoff_base: float = Field(default=float(os.getenv("SUMMARIZER_MAP_BACKOFF_BASE", "1.0")))
+    map_backoff_max: float = Field(default=float(os.getenv("SUMMARIZER_MAP_BACKOFF_MAX", "30.0")))
+    map_latency_spike_factor: float = Field(default=float(os.getenv("SUMMARIZER_MAP_LATENCY_SPIKE_FACTOR", "3.0")))
+    # Uploads are streamed to a temp file in blocks and hashed as they arrive
+    upload_max_bytes: int = Field(default=int(os.getenv("SUMMARIZER_UPLOAD_MAX_BYTES", str(50 * 1024 * 1024))))
+    upload_block_size: int = Field(default=int(os.getenv("SUMMARIZER_UPLOAD_BLOCK_SIZE", str(1024 * 1024))))
+    upload_tmp_dir: Optional[str] = Field(default=os.getenv("SUMMARIZER_UPLOAD_TMP_DIR"))
+    # PDF text extraction runs in a process pool per request, split into page ranges
+    pdf_workers: int = Field(default=int(os.getenv("SUMMARIZER_PDF_WORKERS", "2")))
+    pdf_max_jobs: int = Field(default=int(os.getenv("SUMMARIZER_PDF_MAX_JOBS", "4")))
+    pdf_pages_per_task: int = Field(default=int(os.getenv("SUMMARIZER_PDF_PAGES_PER_TASK", "25")))
+    pdf_max_pages: int = Field(default=int(os.getenv("SUMMARIZER_PDF_MAX_PAGES", "500")))
+    pdf_extract_timeout: float = Field(default=float(os.getenv("SUMMARIZER_PDF_EXTRACT_TIMEOUT", "120.0")))
+    # Seconds without an event before a streaming response sends a keep-alive
+    heartbeat_interval: float = Field(default=float(os.getenv("SUMMARIZER_HEARTBEAT_INTERVAL", "15.0")))
+    # Bump to invalidate every cached summary, e.g. after a prompt change
+    cache_version: str = Field(default=os.getenv("SUMMARIZER_CACHE_VERSION", "1"))
+    
+    class Config:
+        env_prefix = "SUMMARIZER_"
+
+class UsageSettings(BaseSettings):
+    # LLM usage is aggregated per worker and added to Redis every `flush_interval` seconds
+    flush_interval: float = Field(default=float(os.getenv("USAGE_FLUSH_INTERVAL", "10.0")))
+    retention_days: int = Field(default=int(os.getenv("USAGE_RETENTION_DAYS", "35")))
+    max_query_days: int = Field(default=int(os.getenv("USAGE_MAX_QUERY_DAYS", "31")))
+    # Price per 1000 tokens, for cost estimates
+    prompt_cost_per_1k: float = Field(default=float(os.getenv("USAGE_PROMPT_COST_PER_1K", "0.0")))
+    completion_cost_per_1k: float = Field(default=float(os.getenv("USAGE_COMPLETION_COST_PER_1K", "0.0")))
+    
+    class Config:
+        env_prefix = "USAGE_"
+
 class APISettings(BaseSettings):
     host: str = Field(default=os.getenv("API_HOST", "0.0.0.0"))
     port: int = Field(default=int(os.getenv("API_PORT", "8000"))) 
     reload: bool = Field(default=os.getenv("API_RELOAD", "True").lower() == "true")
     debug: bool = Field(default=os.getenv("API_DEBUG", "False").lower() == "true")
+    # Prometheus metrics, served without authentication
+    metrics_enabled: bool = Field(default=os.getenv("API_METRICS_ENABLED", "True").lower() == "true")
+    metrics_path: str = Field(default=os.getenv("API_METRICS_PATH", "/metrics"))
+    # Seconds between sweeps that drop expired entries from the in-memory caches
+    cache_purge_interval: float = Field(default=float(os.getenv("API_CACHE_PURGE_INTERVAL", "60.0")))
     
     class Config:
         env_prefix = "API_"
 
+class HTTPSettings(BaseSettings):
+    # Shared async client for outbound calls to Google APIs
+    max_connections: int = Field(default=int(os.getenv("HTTP_MAX_CONNECTIONS", "100")))
+    max_keepalive_connections: int = Field(default=int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20")))
+    keepalive_expiry: float = Field(default=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60.0")))
+    connect_timeout: float = Field(default=float(os.getenv("HTTP_CONNECT_TIMEOUT", "5.0")))
+    timeout: float = Field(default=float(os.getenv("HTTP_TIMEOUT", "10.0")))
+    http2: bool = Field(default=os.getenv("HTTP_HTTP2", "True").lower() == "true")
+    retries: int = Field(default=int(os.getenv("HTTP_RETRIES", "2")))
+    backoff_base: float = Field(default=float(os.getenv("HTTP_BACKOFF_BASE", "0.2")))
+    
+    class Config:
+        env_prefix = "HTTP_"
+
+class RedisSettings(BaseSettings):
+    host: str = Field(default=os.getenv("REDIS_HOST", "localhost"))
+    port: int = Field(default=int(os.getenv("REDIS_PORT", "6379")))
+    db: int = Field(default=int(os.getenv("REDIS_DB", "0")))
+    password: Optional[str] = Field(default=os.getenv("REDIS_PASSWORD"))
+    max_connections: int = Field(default=int(os.getenv("REDIS_MAX_CONNECTIONS", "50")))
+    socket_timeout: float = Field(default=float(os.getenv("REDIS_SOCKET_TIMEOUT", "5.0")))
+    socket_connect_timeout: float = Field(default=float(os.getenv("REDIS_SOCKET_CONNECT_TIMEOUT", "5.0")))
+    health_check_interval: int = Field(default=int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30")))
+    retry_attempts: int = Field(default=int(os.getenv("REDIS_RETRY_ATTEMPTS", "3")))
+    cache_ttl: int = Field(default=int(os.getenv("REDIS_CACHE_TTL", "3600")))
+
+    class Config:
+        env_prefix = "REDIS_"
+
 class CORSSettings(BaseSettings):
     allow_origins: List[str] = Field(default=["*"])
     allow_credentials: bool = Field(default=True)
@@ -55,8 +198,14 @@ class Settings(BaseSettings):
     
     # Nested settings
     firebase: FirebaseSettings = FirebaseSettings()
+    auth: AuthSettings = AuthSettings()
     llm: LLMSettings = LLMSettings()
+    chat: ChatSettings = ChatSettings()
+    summarizer: SummarizerSettings = SummarizerSettings()
+    usage: UsageSettings = UsageSettings()
     api: APISettings = APISettings()
+    redis: RedisSettings = RedisSettings()
+    http: HTTPSettings = HTTPSettings()
     cors: CORSSettings = CORSSettings()
     
     class Config:
@@ -0,0 +1,12 @@
+"""
+End-to-end load testing of the API against local stand-ins.
+
+- `loadtest.fake_llm`: OpenAI-compatible streaming server with configurable latency
+- `loadtest.server`: the app, booted with stand-in Firebase credentials, a
+  stub token verifier and the Firestore emulator
+- `loadtest.run`: starts both, drives a traffic mix and writes a JSON report
+
+Usage (from the app directory, with Redis and the Firestore emulator running):
+    gcloud emulators firestore start --host-port=localhost:8080
+    python -m loadtest.run --duration 60 --concurrency 32 --output baseline.json
+"""
@@ -0,0 +1,138 @@
+"""
+OpenAI-compatible chat completions server for load tests. Replies are filler
+text generated at a configurable pace, so the app sees realistic time to
+first token and streaming durations without calling a real model.
+
+Usage (from the app directory):
+    python -m loadtest.fake_llm --port 9100 --llm-ttft 0.4 --llm-token-interval 0.02
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = (
+    "the service keeps a rolling summary of every session so that long chats "
+    "stay within the token budget while recent turns are sent verbatim to the model"
+).split()
+
+
+class FakeLLM:
+    """
+    Reply generator. Each reply waits `ttft` seconds (with `jitter` as a
+    relative spread) before its first token and `token_interval` between
+    tokens; `error_rate` of the requests are rejected with a 429.
+    """
+
+    def __init__(self, ttft: float, token_interval: float, tokens: int, jitter: float, error_rate: float):
+        self.ttft = ttft
+        self.token_interval = token_interval
+        self.tokens = tokens
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+    def _spread(self, value: float) -> float:
+        return max(0.0, value * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def reply_tokens(self) -> List[str]:
+        count = max(1, int(self._spread(self.tokens)))
+        return [random.choice(WORDS) + " " for _ in range(count)]
+
+    async def tokens_at_pace(self) -> AsyncIterator[str]:
+        await asyncio.sleep(self._spread(self.ttft))
+        for index, token in enumerate(self.reply_tokens()):
+            if index:
+                await asyncio.sleep(self._spread(self.token_interval))
+            yield token
+
+
+def prompt_tokens(messages: List[Dict[str, Any]]) -> int:
+    return sum(len(str(message.get("content", ""))) for message in messages) // 4 + 1
+
+
+def chunk(completion_id: str, model: str, delta: Dict, finish_reason=None, usage=None) -> str:
+    payload = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [] if usage else [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+    }
+    if usage:
+        payload["usage"] = usage
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+def create_app(llm: FakeLLM) -> FastAPI:
+    app = FastAPI(title="fake-llm")
+
+    @app.post("/v1/chat/completions")
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        if random.random() < llm.error_rate:
+            return JSONResponse(status_code=429, content={"error": {"message": "Rate limit exceeded", "type": "rate_limit"}})
+
+        model = body.get("model", "fake-model")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        usage = {"prompt_tokens": prompt_tokens(body.get("messages", []))}
+
+        if not body.get("stream"):
+            content = "".join([token async for token in llm.tokens_at_pace()])
+            usage["completion_tokens"] = len(content.split())
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+            return JSONResponse(content={
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage
+            })
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        async def events() -> AsyncIterator[str]:
+            count = 0
+            yield chunk(completion_id, model, {"role": "assistant", "content": ""})
+            async for token in llm.tokens_at_pace():
+                count += 1
+                yield chunk(completion_id, model, {"content": token})
+            yield chunk(completion_id, model, {}, finish_reason="stop")
+            if include_usage:
+                usage.update(completion_tokens=count, total_tokens=usage["prompt_tokens"] + count)
+                yield chunk(completion_id, model, {}, usage=usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--llm-ttft", dest="ttft", type=float, default=0.4, help="Seconds until the first token")
+    parser.add_argument("--llm-token-interval", dest="token_interval", type=float, default=0.02, help="Seconds between tokens")
+    parser.add_argument("--llm-tokens", dest="tokens", type=int, default=80, help="Tokens per reply")
+    parser.add_argument("--llm-jitter", dest="jitter", type=float, default=0.25, help="Relative spread of the timings above")
+    parser.add_argument("--llm-error-rate", dest="error_rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    add_arguments(parser)
+    args = parser.parse_args()
+    llm = FakeLLM(args.ttft, args.token_interval, args.tokens, args.jitter, args.error_rate)
+    uvicorn.run(create_app(llm), host=args.host, port=args.port, log_level="warning")
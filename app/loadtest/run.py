@@ -0,0 +1,435 @@
+"""
+Drive a mix of chat, session listing and summarization traffic at the app
+and write throughput and latency percentiles per route as JSON.
+
+By default the fake LLM and the app (`loadtest.fake_llm`, `loadtest.server`)
+are started as subprocesses; pass `--target` to load an app that is already
+running with the stand-ins instead. Each virtual user sends one request at
+a time, picking the route by the weights of `--mix`.
+
+With `--workers N` (or several comma-separated `--target` URLs), N app
+processes are started with the shared history cache enabled and each user
+sends its requests to them in turn, so consecutive chat turns of a session
+land on different workers. The report then includes the history cache
+counters of every worker, including the share of lookups served by Redis.
+
+Usage (from the app directory, with Redis and the Firestore emulator running):
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python -m loadtest.run \\
+        --duration 60 --warmup 10 --concurrency 32 \\
+        --mix chat=5,chat_stream=3,sessions=2,summarize=1,summarize_stream=1 \\
+        --output baseline.json
+
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python -m loadtest.run \\
+        --workers 2 --mix chat=1 --output history-cache.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from loadtest import fake_llm
+from loadtest.server import stub_token
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIX = "chat=5,chat_stream=3,sessions=2,summarize=1,summarize_stream=1"
+
+SENTENCES = [
+    "Load tests replay a fixed mix of requests against local stand-ins.",
+    "Each chat turn reads the session history and appends two messages.",
+    "Summaries are cached by content, so repeated documents are cheap.",
+    "Streaming responses report their first token long before they finish.",
+    "Percentiles are more useful than averages for tail latency.",
+]
+
+
+def percentile(sorted_values: List[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def latency_summary(values: List[float]) -> Dict[str, Optional[float]]:
+    values = sorted(values)
+    return {
+        "mean": sum(values) / len(values) if values else None,
+        "p50": percentile(values, 0.50),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+        "max": values[-1] if values else None
+    }
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown route '{name}' in --mix; expected one of {', '.join(SCENARIOS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+class Results:
+    """Latencies, time to first event and outcomes per route, for requests started after the warmup"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.first_event: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def add(self, route: str, latency: float, status: str, ok: bool, first_event: Optional[float]):
+        self.latencies[route].append(latency)
+        self.statuses[route][status] += 1
+        if not ok:
+            self.errors[route] += 1
+        if first_event is not None:
+            self.first_event[route].append(first_event)
+
+    def report(self, window: float) -> Dict[str, Any]:
+        routes = {}
+        for route, latencies in sorted(self.latencies.items()):
+            routes[route] = {
+                "requests": len(latencies),
+                "errors": self.errors[route],
+                "throughput_rps": len(latencies) / window,
+                "latency_seconds": latency_summary(latencies),
+                "statuses": dict(self.statuses[route])
+            }
+            if self.first_event[route]:
+                routes[route]["first_token_seconds"] = latency_summary(self.first_event[route])
+
+        every_latency = [latency for latencies in self.latencies.values() for latency in latencies]
+        return {
+            "routes": routes,
+            "total": {
+                "requests": len(every_latency),
+                "errors": sum(self.errors.values()),
+                "throughput_rps": len(every_latency) / window,
+                "latency_seconds": latency_summary(every_latency)
+            }
+        }
+
+
+class VirtualUser:
+    """One simulated client; keeps chatting in a session for `turns_per_session` turns"""
+
+    def __init__(self, run_id: str, index: int, turns_per_session: int):
+        self.user_id = f"{run_id}-{index}"
+        self.headers = {"Authorization": f"Bearer {stub_token(self.user_id)}"}
+        self.turns_per_session = turns_per_session
+        self.session_id: Optional[str] = None
+        self.turns = 0
+        self.requests = index
+
+    def next_client(self, clients: List[httpx.AsyncClient]) -> httpx.AsyncClient:
+        """The workers take this user's requests in turn"""
+        self.requests += 1
+        return clients[self.requests % len(clients)]
+
+    def next_session(self) -> Optional[str]:
+        if self.turns >= self.turns_per_session:
+            self.session_id = None
+            self.turns = 0
+        self.turns += 1
+        return self.session_id
+
+
+def chat_message() -> str:
+    return " ".join(random.sample(SENTENCES, 2)) + " What should I look at next?"
+
+
+async def read_events(response: httpx.Response, started: float) -> Tuple[bool, Optional[float], Dict[str, Any]]:
+    """
+    Consume an SSE response. Returns whether it ended without an `error`
+    event, seconds until the first `token` (or `done`) event, and the data
+    of the last event.
+    """
+    first_event = None
+    event = None
+    data: Dict[str, Any] = {}
+    ok = True
+    async for line in response.aiter_lines():
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+            if event in ("token", "done") and first_event is None:
+                first_event = time.perf_counter() - started
+            ok = ok and event != "error"
+        elif line.startswith("data: "):
+            data = json.loads(line[len("data: "):])
+    return ok, first_event, data
+
+
+Outcome = Tuple[str, bool, Optional[float]]
+
+
+async def run_chat(client: httpx.AsyncClient, user: VirtualUser, options: argparse.Namespace) -> Outcome:
+    response = await client.post(
+        "/chatbot/chat",
+        json={"message": chat_message(), "session_id": user.next_session()},
+        headers=user.headers
+    )
+    if response.status_code == 200:
+        user.session_id = response.json().get("session_id")
+    return str(response.status_code), response.status_code == 200, None
+
+
+async def run_chat_stream(client: httpx.AsyncClient, user: VirtualUser, options: argparse.Namespace) -> Outcome:
+    started = time.perf_counter()
+    payload = {"message": chat_message(), "session_id": user.next_session()}
+    async with client.stream("POST", "/chatbot/chat/stream", json=payload, headers=user.headers) as response:
+        if response.status_code != 200:
+            await response.aread()
+            return str(response.status_code), False, None
+        ok, first_event, data = await read_events(response, started)
+    if ok:
+        user.session_id = data.get("session_id", user.session_id)
+    return "200" if ok else "stream_error", ok, first_event
+
+
+async def run_sessions(client: httpx.AsyncClient, user: VirtualUser, options: argparse.Namespace) -> Outcome:
+    response = await client.get("/chatbot/sessions", headers=user.headers)
+    return str(response.status_code), response.status_code == 200, None
+
+
+def summary_document(options: argparse.Namespace) -> str:
+    """One of `documents` fixed texts, so that repeats exercise the summary cache"""
+    number = random.randrange(options.documents)
+    rng = random.Random(f"{options.run_id}-{number}")
+    text = [f"Document {number} of {options.run_id}."]
+    while sum(len(sentence) + 1 for sentence in text) < options.document_chars:
+        text.append(rng.choice(SENTENCES))
+    return " ".join(text)
+
+
+async def run_summarize(client: httpx.AsyncClient, user: VirtualUser, options: argparse.Namespace) -> Outcome:
+    # The text endpoint is a GET with a JSON body
+    response = await client.request(
+        "GET", "/summarizer/text", json={"text": summary_document(options)}, headers=user.headers
+    )
+    ok = response.status_code == 200 and response.json().get("status") == "success"
+    return str(response.status_code), ok, None
+
+
+async def run_summarize_stream(client: httpx.AsyncClient, user: VirtualUser, options: argparse.Namespace) -> Outcome:
+    started = time.perf_counter()
+    payload = {"text": summary_document(options)}
+    async with client.stream("POST", "/summarizer/text/stream", json=payload, headers=user.headers) as response:
+        if response.status_code != 200:
+            await response.aread()
+            return str(response.status_code), False, None
+        ok, first_event, _ = await read_events(response, started)
+    return "200" if ok else "stream_error", ok, first_event
+
+
+SCENARIOS: Dict[str, Callable[[httpx.AsyncClient, VirtualUser, argparse.Namespace], Awaitable[Outcome]]] = {
+    "chat": run_chat,
+    "chat_stream": run_chat_stream,
+    "sessions": run_sessions,
+    "summarize": run_summarize,
+    "summarize_stream": run_summarize_stream,
+}
+
+
+async def user_loop(
+    clients: List[httpx.AsyncClient],
+    user: VirtualUser,
+    mix: Dict[str, float],
+    options: argparse.Namespace,
+    results: Results,
+    measure_from: float,
+    stop_at: float
+):
+    routes, weights = list(mix), list(mix.values())
+    while time.perf_counter() < stop_at:
+        route = random.choices(routes, weights)[0]
+        started = time.perf_counter()
+        try:
+            status, ok, first_event = await SCENARIOS[route](user.next_client(clients), user, options)
+        except httpx.HTTPError as e:
+            status, ok, first_event = type(e).__name__, False, None
+        if started >= measure_from:
+            results.add(route, time.perf_counter() - started, status, ok, first_event)
+        if options.think_time:
+            await asyncio.sleep(random.expovariate(1 / options.think_time))
+
+
+async def drive(options: argparse.Namespace, mix: Dict[str, float]) -> Dict[str, Any]:
+    limits = httpx.Limits(max_connections=options.concurrency, max_keepalive_connections=options.concurrency)
+    timeout = httpx.Timeout(options.request_timeout)
+    results = Results()
+    clients = [httpx.AsyncClient(base_url=target, limits=limits, timeout=timeout) for target in options.targets]
+    try:
+        users = [VirtualUser(options.run_id, index, options.turns_per_session) for index in range(options.concurrency)]
+        start = time.perf_counter()
+        measure_from = start + options.warmup
+        stop_at = measure_from + options.duration
+        await asyncio.gather(*(
+            user_loop(clients, user, mix, options, results, measure_from, stop_at) for user in users
+        ))
+        # Requests still running at `stop_at` finish and are counted
+        window = max(time.perf_counter() - measure_from, 1e-9)
+        history_cache = await history_cache_stats(clients, users[0])
+    finally:
+        await asyncio.gather(*(client.aclose() for client in clients))
+    return {**results.report(window), "window_seconds": window, "history_cache": history_cache}
+
+
+async def history_cache_stats(clients: List[httpx.AsyncClient], user: VirtualUser) -> Dict[str, Any]:
+    """
+    History cache counters of each worker since it started (warmup included),
+    and their totals. `redis_hit_ratio` is the share of lookups that missed
+    the worker's own copy and were served from Redis.
+    """
+    workers = []
+    for client in clients:
+        try:
+            response = await client.get("/chatbot/cache/stats", headers=user.headers)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.warning(f"Failed to read cache stats from {client.base_url}: {str(e)}")
+            continue
+        history = response.json()["history"]
+        workers.append({
+            "target": str(client.base_url),
+            **{name: history[name] for name in ("local_hits", "redis_hits", "misses", "hit_ratio")}
+        })
+
+    totals = {name: sum(worker[name] for worker in workers) for name in ("local_hits", "redis_hits", "misses")}
+    lookups = sum(totals.values())
+    return {
+        "workers": workers,
+        **totals,
+        "hit_ratio": (totals["local_hits"] + totals["redis_hits"]) / lookups if lookups else None,
+        "redis_hit_ratio": totals["redis_hits"] / lookups if lookups else None
+    }
+
+
+async def wait_until_ready(url: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise SystemExit(f"{url} did not become ready within {timeout} seconds")
+            await asyncio.sleep(0.25)
+
+
+def start_stand_ins(options: argparse.Namespace) -> List[subprocess.Popen]:
+    llm_port = options.llm_port
+    app_ports = [options.port + index for index in range(options.workers)]
+    processes = [
+        subprocess.Popen([
+            sys.executable, "-m", "loadtest.fake_llm", "--port", str(llm_port),
+            "--llm-ttft", str(options.ttft), "--llm-token-interval", str(options.token_interval),
+            "--llm-tokens", str(options.tokens), "--llm-jitter", str(options.jitter),
+            "--llm-error-rate", str(options.error_rate)
+        ])
+    ]
+    # Workers only share history windows through Redis
+    env = {**os.environ, "CHAT_HISTORY_CACHE_REDIS": "true"} if options.workers > 1 else None
+    for app_port in app_ports:
+        processes.append(subprocess.Popen([
+            sys.executable, "-m", "loadtest.server", "--port", str(app_port),
+            "--llm-endpoint", f"http://127.0.0.1:{llm_port}/v1"
+        ], env=env))
+    options.targets = [f"http://127.0.0.1:{app_port}" for app_port in app_ports]
+    return processes
+
+
+async def main(options: argparse.Namespace) -> Dict[str, Any]:
+    mix = parse_mix(options.mix)
+    started_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    options.targets = [target.strip() for target in options.target.split(",")] if options.target else []
+    processes = [] if options.targets else start_stand_ins(options)
+    try:
+        if processes:
+            await wait_until_ready(f"http://127.0.0.1:{options.llm_port}/health", options.startup_timeout)
+        for target in options.targets:
+            await wait_until_ready(f"{target}/", options.startup_timeout)
+        logger.info(f"Driving {', '.join(options.targets)} with {options.concurrency} users for {options.duration}s")
+        result = await drive(options, mix)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+    return {
+        "run_id": options.run_id,
+        "started_at": started_at,
+        "config": {
+            "targets": options.targets,
+            "mix": mix,
+            "concurrency": options.concurrency,
+            "duration": options.duration,
+            "warmup": options.warmup,
+            "think_time": options.think_time,
+            "turns_per_session": options.turns_per_session,
+            "documents": options.documents,
+            "document_chars": options.document_chars,
+            "llm": None if not processes else {
+                "ttft": options.ttft,
+                "token_interval": options.token_interval,
+                "tokens": options.tokens,
+                "jitter": options.jitter,
+                "error_rate": options.error_rate
+            }
+        },
+        **result
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", help="Base URLs (comma-separated) of app workers already running with the stand-ins")
+    parser.add_argument("--port", type=int, default=8000, help="Port for the app when it is started here")
+    parser.add_argument("--workers", type=int, default=1, help="App processes to start on consecutive ports")
+    parser.add_argument("--llm-port", type=int, default=9100, help="Port for the fake LLM when it is started here")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Comma-separated route=weight pairs")
+    parser.add_argument("--concurrency", type=int, default=16, help="Virtual users")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds measured after the warmup")
+    parser.add_argument("--warmup", type=float, default=10.0, help="Seconds of traffic before measuring")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Mean pause between a user's requests")
+    parser.add_argument("--turns-per-session", type=int, default=10, help="Chat turns before a user opens a new session")
+    parser.add_argument("--documents", type=int, default=20, help="Distinct texts the summarize routes draw from")
+    parser.add_argument("--document-chars", type=int, default=6000, help="Length of each text")
+    parser.add_argument("--request-timeout", type=float, default=300.0)
+    parser.add_argument("--startup-timeout", type=float, default=30.0)
+    parser.add_argument("--run-id", default=f"loadtest-{uuid.uuid4().hex[:8]}", help="Prefix of the simulated user IDs")
+    parser.add_argument("--seed", type=int, help="Seed for the traffic mix")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    fake_llm.add_arguments(parser)
+    options = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if options.seed is not None:
+        random.seed(options.seed)
+    report = asyncio.run(main(options))
+
+    body = json.dumps(report, indent=2)
+    if options.output:
+        with open(options.output, "w") as f:
+            f.write(body + "\n")
+        logger.info(f"Wrote report to {options.output}")
+    else:
+        print(body)
@@ -0,0 +1,84 @@
+"""
+Boot the app for load tests without any Google services:
+
+- Firebase Admin is initialized with anonymous credentials, so no service
+  account key is read; Firestore goes to the emulator at
+  FIRESTORE_EMULATOR_HOST, which must be set
+- ID tokens are checked by a stub verifier that accepts `loadtest:<uid>`
+- the LLM endpoint points at `loadtest.fake_llm`
+
+Redis is the local instance from the usual REDIS_* settings. The app runs
+in a single worker, since the stand-ins are installed in this process.
+
+Usage (from the app directory):
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python -m loadtest.server --port 8000
+"""
+import argparse
+import os
+import time
+from typing import Dict
+
+import firebase_admin
+import google.auth.credentials
+from firebase_admin import credentials
+
+STUB_TOKEN_PREFIX = "loadtest:"
+
+
+class AnonymousCredential(credentials.Base):
+    """Firebase Admin credential that sends no authorization; only the emulator accepts it"""
+
+    def get_credential(self):
+        return google.auth.credentials.AnonymousCredentials()
+
+
+def stub_token(user_id: str) -> str:
+    """Bearer token the stub verifier accepts for `user_id`"""
+    return f"{STUB_TOKEN_PREFIX}{user_id}"
+
+
+async def decode_stub_token(token: str) -> Dict:
+    """Claims of a stub token, in the shape the Firebase Admin SDK returns"""
+    if not token.startswith(STUB_TOKEN_PREFIX):
+        raise ValueError("Not a load-test token")
+    user_id = token[len(STUB_TOKEN_PREFIX):]
+    return {"uid": user_id, "email": f"{user_id}@loadtest.invalid", "exp": time.time() + 3600}
+
+
+def configure_environment(llm_endpoint: str, project_id: str):
+    """Settings for the stand-ins; must run before the app's settings are imported"""
+    if not os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        raise SystemExit("FIRESTORE_EMULATOR_HOST must point at a running Firestore emulator")
+    os.environ["LLM_ENDPOINT"] = llm_endpoint
+    os.environ.setdefault("LLM_TOKEN", "loadtest")
+    os.environ.setdefault("LLM_MODEL", "gpt-4o-mini")
+    os.environ["AUTH_LOCAL_VERIFICATION"] = "false"
+    os.environ["GOOGLE_CLOUD_PROJECT"] = project_id
+    os.environ["API_RELOAD"] = "false"
+
+
+def install_stand_ins(project_id: str):
+    """Initialize Firebase Admin before `services.auth_service` does, and swap in the stub verifier"""
+    firebase_admin.initialize_app(AnonymousCredential(), options={"projectId": project_id})
+
+    from services.token_verifier import token_verifier
+    # The verifier's caching and request coalescing still run; only decoding is replaced
+    token_verifier._decode = decode_stub_token
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--llm-endpoint", default="http://127.0.0.1:9100/v1")
+    parser.add_argument("--project-id", default="skynet-loadtest")
+    parser.add_argument("--log-level", default="warning")
+    args = parser.parse_args()
+
+    configure_environment(args.llm_endpoint, args.project_id)
+    install_stand_ins(args.project_id)
+
+    import uvicorn
+    from main import app
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level=args.log_level, access_log=False)
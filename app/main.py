@@ -1,9 +1,23 @@
-from fastapi import FastAPI, Request
+import time
+
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from routes import summarizer, auth, chatbot
+from routes import summarizer, auth, chatbot, usage
 from middleware.auth_middleware import firebase_auth_middleware
+from middleware.upload_limit import UploadLimitMiddleware
 from config.settings import get_settings
-from redis import Redis
+from utils.redis_client import create_redis_client
+from utils.llm import model_registry
+from utils.pdf import shutdown_pdf_pools
+from services.key_manager import key_manager
+from utils.http_client import close_http_client
+from services.chat_history import chat_write_buffer, history_cache
+from services.profile_cache import profile_cache
+from services.chatbot_service import session_manager
+from services.token_verifier import token_verifier
+from utils.lru import CachePurger
+from utils.usage import usage_recorder
+from utils.metrics import REQUEST_LATENCY, REQUESTS_IN_FLIGHT, METRICS_CONTENT_TYPE, metrics_response_body
 from contextlib import asynccontextmanager
 
 
@@ -12,11 +26,35 @@ from contextlib import asynccontextmanager
 
 settings = get_settings()
 
+cache_purger = CachePurger(
+    [session_manager.sessions, history_cache.local, profile_cache.local, token_verifier.cache],
+    settings.api.cache_purge_interval
+)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    app.state.redis = Redis(host="localhost", port=6379)
+    app.state.redis = create_redis_client(settings.redis)
+    if settings.chat.history_cache_redis:
+        history_cache.redis = app.state.redis
+    if settings.auth.local_verification:
+        await key_manager.start()
+    await chat_write_buffer.start()
+    await profile_cache.start(app.state.redis)
+    await usage_recorder.start(app.state.redis)
+    await cache_purger.start()
     yield
-    app.state.redis.close()
+    await cache_purger.stop()
+    # Drain buffered chat writes before the clients they need are closed
+    await chat_write_buffer.close()
+    await key_manager.stop()
+    await profile_cache.stop()
+    # Write out pending LLM usage while Redis is still open
+    await usage_recorder.stop()
+    await app.state.redis.aclose()
+    await app.state.redis.connection_pool.disconnect()
+    await model_registry.aclose()
+    await shutdown_pdf_pools()
+    await close_http_client()
 
 
 
@@ -34,11 +72,45 @@ app.add_middleware(
     allow_methods=settings.cors.allow_methods,
     allow_headers=settings.cors.allow_headers,
 )
+app.add_middleware(
+    UploadLimitMiddleware,
+    paths=["/summarizer/file", "/summarizer/file/stream"],
+    max_bytes=settings.summarizer.upload_max_bytes
+)
 
 # Add Firebase auth middleware
 @app.middleware("http")
 async def auth_middleware(request: Request, call_next):
     return await firebase_auth_middleware(request, call_next) 
+
+# Request metrics; added last so that it also times authentication
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    if not settings.api.metrics_enabled or request.url.path == settings.api.metrics_path:
+        return await call_next(request)
+    
+    REQUESTS_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        REQUESTS_IN_FLIGHT.dec()
+        # Label by route template, not raw path, to keep the series bounded
+        route = request.scope.get("route")
+        REQUEST_LATENCY.labels(
+            request.method,
+            route.path if route is not None else "unmatched",
+            str(status_code)
+        ).observe(time.perf_counter() - start)
+
+if settings.api.metrics_enabled:
+    @app.get(settings.api.metrics_path, include_in_schema=False)
+    def metrics():
+        return Response(content=metrics_response_body(), media_type=METRICS_CONTENT_TYPE)
+
 @app.get("/")
 def read_root():
     return {"Hello": "World"}
@@ -47,6 +119,7 @@ def read_root():
 app.include_router(summarizer.router)
 app.include_router(auth.router)
 app.include_router(chatbot.router)  
+app.include_router(usage.router)
 
 if __name__ == "__main__":
     import uvicorn
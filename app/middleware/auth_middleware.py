@@ -3,6 +3,11 @@ from fastapi.responses import JSONResponse
 import firebase_admin
 from firebase_admin import auth
 from services.firebase_auth_service import FirebaseAuthService
+from services.token_verifier import token_verifier
+from config.settings import get_settings
+from utils.metrics import timed
+
+settings = get_settings()
 
 # Initialize the Firebase Auth Service
 firebase_auth = FirebaseAuthService()
@@ -11,7 +16,7 @@ async def firebase_auth_middleware(request: Request, call_next):
     """Middleware to verify Firebase ID tokens for protected routes"""
     
     # Skip authentication for non-protected routes
-    if request.url.path in ["/", "/docs", "/openapi.json", "/auth/login", "/auth/register", "/auth/google"]:
+    if request.url.path in ["/", "/docs", "/openapi.json", "/auth/login", "/auth/register", "/auth/google", settings.api.metrics_path]:
         return await call_next(request)
     
     # Check for Authorization header
@@ -26,18 +31,15 @@ async def firebase_auth_middleware(request: Request, call_next):
     # Extract and verify token
     token = authorization.replace("Bearer ", "")
     try:
-        # Use Firebase Admin SDK for token verification
-        decoded_token = auth.verify_id_token(token)
+        # Verify with the Firebase Admin SDK, reusing cached results for known tokens
+        with timed("auth", "verify_token"):
+            user = await token_verifier.verify(token)
         # Add user info to request state
-        request.state.user = {
-            "uid": decoded_token["uid"],
-            "email": decoded_token.get("email", ""),
-            "role": decoded_token.get("role", "user")
-        }
-        return await call_next(request) 
+        request.state.user = user
     except Exception as e:
         return JSONResponse(
             status_code=status.HTTP_401_UNAUTHORIZED,
             content={"detail": f"Invalid authentication token: {str(e)}"},
             headers={"WWW-Authenticate": "Bearer"},
-        )
\ No newline at end of file
+        )
+    return await call_next(request)
\ No newline at end of file
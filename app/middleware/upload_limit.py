@@ -0,0 +1,55 @@
+from typing import Iterable
+
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+
+# Room for multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadLimitMiddleware:
+    """
+    Refuse oversized upload bodies before the multipart parser spools them.
+
+    A `Content-Length` over the limit is answered with a 413 without reading
+    the body. Bodies without one (chunked) are counted as they are received
+    and abort parsing with a 413 as soon as they pass the limit.
+    """
+
+    def __init__(self, app, paths: Iterable[str], max_bytes: int):
+        self.app = app
+        self.paths = set(paths)
+        self.max_bytes = max_bytes
+        self.max_body = max_bytes + MULTIPART_OVERHEAD
+
+    def _too_large(self, size: int) -> str:
+        return f"Request body of {size} bytes exceeds the upload limit of {self.max_bytes} bytes."
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_body:
+            response = JSONResponse(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                content={"status": "error", "message": self._too_large(int(content_length))}
+            )
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body:
+                    # Raised inside body parsing, so FastAPI turns it into the response
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=self._too_large(received)
+                    )
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,33 @@
+"""
+Move every chat session from the legacy `messages` array on the session
+document to the ordered `messages` subcollection.
+
+Sessions are also migrated lazily the first time they are read, so running
+this is optional; it is meant for migrating all data ahead of time.
+
+Usage (from the app directory):
+    python -m migrations.chat_messages
+"""
+import asyncio
+import logging
+
+# Importing the auth service initializes the Firebase Admin app
+import services.auth_service  # noqa: F401
+from repositories.chat_repository import chat_repository, migrate_session_messages
+
+logger = logging.getLogger(__name__)
+
+
+async def migrate_all_sessions() -> int:
+    """Migrate every session that still has a `messages` array; returns the count"""
+    migrated = 0
+    async for doc_ref, data in chat_repository.legacy_sessions():
+        await migrate_session_messages(chat_repository.client, doc_ref, data)
+        migrated += 1
+    return migrated
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    count = asyncio.run(migrate_all_sessions())
+    logger.info(f"Migrated {count} chat sessions")
@@ -15,6 +15,31 @@ class ChatSession(BaseModel):
     is_active: bool
     messages: List[Dict[str, Any]] = []
 
+class ChatSessionSummary(BaseModel):
+    id: str
+    name: str
+    created_at: str
+    updated_at: str
+    message_count: int = 0
+
+class ChatSessionPage(BaseModel):
+    sessions: List[ChatSessionSummary]
+    next_cursor: Optional[str] = None
+
+class StoredChatMessage(BaseModel):
+    role: str
+    content: str
+    timestamp: Optional[str] = None
+    seq: int
+
+class ChatMessagePage(BaseModel):
+    session_id: str
+    messages: List[StoredChatMessage]
+    next_cursor: Optional[str] = None
+
+class BulkDeleteRequest(BaseModel):
+    session_ids: List[str]
+
 class ChatRequest(BaseModel):
     message: str
     session_id: Optional[str] = None
\ No newline at end of file
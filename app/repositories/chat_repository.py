@@ -0,0 +1,358 @@
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+import logging
+
+from firebase_admin import firestore
+from google.cloud.firestore_v1.base_query import FieldFilter
+from utils.firestore import get_firestore_client
+from utils.metrics import timed_async
+from utils.llm import count_tokens
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# Firestore caps a batch at 500 writes
+BATCH_SIZE = 400
+
+
+class LegacySessionError(Exception):
+    """The session still stores its messages in the legacy array field"""
+
+
+class InvalidCursorError(Exception):
+    """A pagination cursor does not point at an existing item"""
+
+
+def message_doc_id(seq: int) -> str:
+    """Zero-padded so document IDs sort in message order"""
+    return f"{seq:010d}"
+
+
+def message_tokens(message_dict: Dict) -> int:
+    """Token count stored with a message, computed for messages saved before counts were kept"""
+    tokens = message_dict.get("tokens")
+    return tokens if tokens is not None else count_tokens(message_dict["content"])
+
+
+def session_version(data: Dict) -> List:
+    """What a cached history window is checked against; see HistoryCache"""
+    return [data.get("updated_at"), data.get("summarized_count", 0)]
+
+
+async def migrate_session_messages(client, doc_ref, data: Dict) -> Optional[Dict]:
+    """
+    Move a session's legacy `messages` array into the `messages`
+    subcollection and drop the array from the session document. Safe to run
+    more than once, including concurrently; returns the session data as it
+    looks afterwards, or None if the session was deleted meanwhile.
+    """
+    legacy_messages = data.get("messages", [])
+    messages_ref = doc_ref.collection("messages")
+    for offset in range(0, len(legacy_messages), BATCH_SIZE):
+        batch = client.batch()
+        for seq, message_dict in enumerate(legacy_messages[offset:offset + BATCH_SIZE], start=offset):
+            batch.set(messages_ref.document(message_doc_id(seq)), {
+                **message_dict,
+                "seq": seq,
+                "tokens": message_tokens(message_dict)
+            })
+        await batch.commit()
+
+    @firestore.async_transactional
+    async def finish(transaction):
+        snapshot = await doc_ref.get(transaction=transaction)
+        if not snapshot.exists:
+            return None
+        current = snapshot.to_dict()
+        if "messages" not in current:
+            # Another worker finished first and may have appended since, so
+            # its message_count must not be reset
+            return current
+        # Copy anything added to the array since it was read above
+        for seq, message_dict in enumerate(current["messages"][len(legacy_messages):], start=len(legacy_messages)):
+            transaction.set(messages_ref.document(message_doc_id(seq)), {
+                **message_dict,
+                "seq": seq,
+                "tokens": message_tokens(message_dict)
+            })
+        message_count = len(current["messages"])
+        transaction.update(doc_ref, {
+            "messages": firestore.DELETE_FIELD,
+            "message_count": message_count
+        })
+        logger.info(f"Migrated {message_count} messages of session {doc_ref.id} to a subcollection")
+        current = {key: value for key, value in current.items() if key != "messages"}
+        current["message_count"] = message_count
+        return current
+
+    return await finish(client.transaction())
+
+
+class ChatRepository:
+    """
+    Chat sessions and their messages in Firestore, on the async client.
+
+    Sessions live at `users/{uid}/chat_sessions/{session_id}`; their messages
+    are documents of the session's `messages` subcollection with zero-padded
+    sequence numbers as IDs. Pass a client to run against another project or
+    the emulator; by default the app's shared client is used.
+    """
+
+    def __init__(self, client=None):
+        self._client = client
+
+    @property
+    def client(self):
+        return self._client if self._client is not None else get_firestore_client()
+
+    def sessions_ref(self, user_id: str):
+        return self.client.collection("users").document(user_id).collection("chat_sessions")
+
+    def session_ref(self, user_id: str, session_id: str):
+        return self.sessions_ref(user_id).document(session_id)
+
+    def messages_ref(self, user_id: str, session_id: str):
+        return self.session_ref(user_id, session_id).collection("messages")
+
+    @timed_async("firestore")
+    async def create_session(self, user_id: str, session_id: str, data: Dict):
+        await self.session_ref(user_id, session_id).set(data)
+
+    @timed_async("firestore")
+    async def get_session(self, user_id: str, session_id: str, field_paths: Optional[List[str]] = None) -> Optional[Dict]:
+        """Session document, or only the given fields of it; None if it does not exist"""
+        snapshot = await self.session_ref(user_id, session_id).get(field_paths=field_paths)
+        return snapshot.to_dict() if snapshot.exists else None
+
+    @timed_async("firestore")
+    async def load_session(self, user_id: str, session_id: str) -> Optional[Dict]:
+        """Read the session document, migrating legacy array storage on the way"""
+        doc_ref = self.session_ref(user_id, session_id)
+        snapshot = await doc_ref.get()
+        if not snapshot.exists:
+            return None
+        data = snapshot.to_dict()
+        if "messages" in data:
+            data = await migrate_session_messages(self.client, doc_ref, data)
+        return data
+
+    @timed_async("firestore")
+    async def existing_sessions(self, user_id: str, session_ids: List[str]) -> Set[str]:
+        """IDs among `session_ids` that name existing sessions, in one round-trip"""
+        doc_refs = [self.session_ref(user_id, session_id) for session_id in session_ids]
+        return {
+            snapshot.id
+            async for snapshot in self.client.get_all(doc_refs, field_paths=["name"])
+            if snapshot.exists
+        }
+
+    @timed_async("firestore")
+    async def list_sessions(
+        self,
+        user_id: str,
+        fields: List[str],
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Sessions projected to `fields`, most recently updated first. `cursor`
+        is the ID of the last session of the previous page; returns the page
+        and the cursor of the next one, or None when there are no more.
+        """
+        sessions_ref = self.sessions_ref(user_id)
+        query = sessions_ref.select(fields).order_by("updated_at", direction=firestore.Query.DESCENDING)
+        if cursor:
+            cursor_snapshot = await sessions_ref.document(cursor).get()
+            if not cursor_snapshot.exists:
+                raise InvalidCursorError(cursor)
+            query = query.start_after(cursor_snapshot)
+        if limit:
+            # One extra document tells whether another page follows
+            query = query.limit(limit + 1)
+
+        result = []
+        async for snapshot in query.stream():
+            session_data = snapshot.to_dict()
+            session_data["id"] = snapshot.id
+            result.append(session_data)
+
+        if limit and len(result) > limit:
+            result = result[:limit]
+            return result, result[-1]["id"]
+        return result, None
+
+    @timed_async("firestore")
+    async def list_messages(
+        self,
+        user_id: str,
+        session_id: str,
+        limit: int,
+        after: Optional[int] = None
+    ) -> Tuple[List[Dict], Optional[int]]:
+        """
+        Up to `limit` messages with `seq > after`, oldest first, and the
+        sequence number to continue after, or None when there are no more.
+        """
+        query = self.messages_ref(user_id, session_id).order_by("seq")
+        if after is not None:
+            query = query.where(filter=FieldFilter("seq", ">", after))
+        messages = [snapshot.to_dict() async for snapshot in query.limit(limit + 1).stream()]
+        if len(messages) > limit:
+            messages = messages[:limit]
+            return messages, messages[-1]["seq"]
+        return messages, None
+
+    @timed_async("firestore")
+    async def recent_messages(
+        self,
+        user_id: str,
+        session_id: str,
+        min_seq: int,
+        token_budget: int,
+        page_size: int
+    ) -> List[Dict]:
+        """
+        Most recent messages with `seq >= min_seq` that fit in `token_budget`,
+        oldest first, fetched newest-first a page at a time with a query
+        cursor. The newest message is always included.
+        """
+        query = (
+            self.messages_ref(user_id, session_id)
+            .where(filter=FieldFilter("seq", ">=", min_seq))
+            .order_by("seq", direction=firestore.Query.DESCENDING)
+            .limit(page_size)
+        )
+        window = []
+        used = 0
+        cursor = None
+        while True:
+            page = [snapshot async for snapshot in (query.start_after(cursor) if cursor else query).stream()]
+            for snapshot in page:
+                message_dict = snapshot.to_dict()
+                tokens = message_tokens(message_dict)
+                if window and used + tokens > token_budget:
+                    return list(reversed(window))
+                window.append(message_dict)
+                used += tokens
+            if len(page) < page_size:
+                return list(reversed(window))
+            cursor = page[-1]
+
+    @timed_async("firestore")
+    async def messages_between(self, user_id: str, session_id: str, start_seq: int, end_seq: int) -> List[Dict]:
+        """Messages with `start_seq <= seq < end_seq`, oldest first"""
+        query = (
+            self.messages_ref(user_id, session_id)
+            .where(filter=FieldFilter("seq", ">=", start_seq))
+            .where(filter=FieldFilter("seq", "<", end_seq))
+            .order_by("seq")
+        )
+        return [snapshot.to_dict() async for snapshot in query.stream()]
+
+    @timed_async("firestore")
+    async def append_messages(self, user_id: str, session_id: str, message_dicts: List[Dict]) -> Optional[Tuple[List, List, List[Dict]]]:
+        """
+        Append messages and bump the session's `message_count` and `updated_at`
+        in one transaction, assigning sequence numbers from `message_count`.
+        Returns the session version before and after the write and the stored
+        messages, or None if the session no longer exists.
+        """
+        doc_ref = self.session_ref(user_id, session_id)
+
+        @firestore.async_transactional
+        async def append(transaction):
+            snapshot = await doc_ref.get(transaction=transaction)
+            if not snapshot.exists:
+                # Deleted while the turn was in flight, possibly by another worker
+                logger.warning(f"Dropping {len(message_dicts)} messages for deleted session {session_id}")
+                return None
+            data = snapshot.to_dict()
+            if "messages" in data:
+                raise LegacySessionError(session_id)
+            next_seq = data.get("message_count", 0)
+            messages_ref = doc_ref.collection("messages")
+            stored = []
+            for offset, message_dict in enumerate(message_dicts):
+                seq = next_seq + offset
+                stored.append({**message_dict, "seq": seq})
+                transaction.set(messages_ref.document(message_doc_id(seq)), stored[-1])
+            updated_at = datetime.now().isoformat()
+            transaction.update(doc_ref, {
+                "message_count": next_seq + len(message_dicts),
+                "updated_at": updated_at
+            })
+            return session_version(data), session_version({**data, "updated_at": updated_at}), stored
+
+        try:
+            return await append(self.client.transaction())
+        except LegacySessionError:
+            snapshot = await doc_ref.get()
+            await migrate_session_messages(self.client, doc_ref, snapshot.to_dict() or {})
+            return await append(self.client.transaction())
+
+    @timed_async("firestore")
+    async def save_summary(self, user_id: str, session_id: str, expected_count: int, summary: str, summarized_count: int) -> bool:
+        """
+        Store a new rolling summary, unless another writer advanced
+        `summarized_count` past `expected_count` first. Returns whether it was saved.
+        """
+        doc_ref = self.session_ref(user_id, session_id)
+
+        @firestore.async_transactional
+        async def save(transaction):
+            snapshot = await doc_ref.get(transaction=transaction)
+            if not snapshot.exists or snapshot.to_dict().get("summarized_count", 0) != expected_count:
+                return False
+            transaction.update(doc_ref, {"summary": summary, "summarized_count": summarized_count})
+            return True
+
+        return await save(self.client.transaction())
+
+    @timed_async("firestore")
+    async def delete_sessions(self, user_id: str, session_ids: List[str]):
+        """
+        Delete sessions together with their message documents using batched
+        writes, each session document after its messages. Messages are listed
+        by reference only, so their contents are never read.
+        """
+        batch = self.client.batch()
+        pending = 0
+        for session_id in session_ids:
+            doc_ref = self.session_ref(user_id, session_id)
+            refs = [ref async for ref in doc_ref.collection("messages").list_documents(page_size=BATCH_SIZE)]
+            for ref in refs + [doc_ref]:
+                batch.delete(ref)
+                pending += 1
+                if pending == BATCH_SIZE:
+                    await batch.commit()
+                    batch = self.client.batch()
+                    pending = 0
+        if pending:
+            await batch.commit()
+
+    @timed_async("firestore")
+    async def clear_session(self, user_id: str, session_id: str):
+        """Delete every message of a session and reset its counters and summary"""
+        refs = [ref async for ref in self.messages_ref(user_id, session_id).list_documents(page_size=BATCH_SIZE)]
+        for offset in range(0, len(refs), BATCH_SIZE):
+            batch = self.client.batch()
+            for ref in refs[offset:offset + BATCH_SIZE]:
+                batch.delete(ref)
+            await batch.commit()
+        await self.session_ref(user_id, session_id).update({
+            "messages": firestore.DELETE_FIELD,
+            "message_count": 0,
+            "summary": "",
+            "summarized_count": 0,
+            "updated_at": datetime.now().isoformat()
+        })
+
+    async def legacy_sessions(self) -> AsyncIterator[Tuple[Any, Dict]]:
+        """Every session, across users, that still has a `messages` array"""
+        async for snapshot in self.client.collection_group("chat_sessions").stream():
+            data = snapshot.to_dict()
+            if "messages" in data:
+                yield snapshot.reference, data
+
+
+chat_repository = ChatRepository()
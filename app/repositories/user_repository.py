@@ -0,0 +1,40 @@
+from typing import Dict, Optional
+
+from firebase_admin import firestore
+from utils.firestore import get_firestore_client
+from utils.metrics import timed_async
+
+
+class UserRepository:
+    """
+    User profiles at `users/{uid}` in Firestore, on the async client. Pass a
+    client to run against another project or the emulator; by default the
+    app's shared client is used.
+    """
+
+    def __init__(self, client=None):
+        self._client = client
+
+    @property
+    def client(self):
+        return self._client if self._client is not None else get_firestore_client()
+
+    def user_ref(self, user_id: str):
+        return self.client.collection("users").document(user_id)
+
+    @timed_async("firestore")
+    async def get_profile(self, user_id: str) -> Optional[Dict]:
+        snapshot = await self.user_ref(user_id).get()
+        return snapshot.to_dict() if snapshot.exists else None
+
+    @timed_async("firestore")
+    async def create_profile(self, user_id: str, profile: Dict):
+        """Create the profile, stamping `createdAt` with the server time"""
+        await self.user_ref(user_id).set({**profile, "createdAt": firestore.SERVER_TIMESTAMP})
+
+    @timed_async("firestore")
+    async def update_profile(self, user_id: str, profile_data: Dict):
+        await self.user_ref(user_id).update(profile_data)
+
+
+user_repository = UserRepository()
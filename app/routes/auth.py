@@ -36,7 +36,7 @@ async def register(user_data: UserRegistration):
     """Register a new user with email and password"""
     try:
         # Use the REST API service for registration
-        result = firebase_auth.sign_up_with_email_password(
+        result = await firebase_auth.sign_up_with_email_password(
             email=user_data.email,
             password=user_data.password
         )
@@ -45,7 +45,7 @@ async def register(user_data: UserRegistration):
         user_id = result.get("localId")
         if user_id and user_data.display_name:
             # Update profile with display name
-            firebase_auth.update_profile(
+            await firebase_auth.update_profile(
                 id_token=result.get("idToken"),
                 display_name=user_data.display_name
             )
@@ -65,7 +65,7 @@ async def register(user_data: UserRegistration):
 async def login(user_data: UserLogin):
     """Login with email and password"""
     try:
-        result = firebase_auth.sign_in_with_email_password(
+        result = await firebase_auth.sign_in_with_email_password(
             email=user_data.email,
             password=user_data.password
         )
@@ -87,7 +87,7 @@ async def login(user_data: UserLogin):
 async def google_sign_in(id_token: str):
     """Sign in with Google"""
     try:
-        result = firebase_auth.sign_in_with_google(id_token)
+        result = await firebase_auth.sign_in_with_google(id_token)
         
         return JSONResponse(content={
             "status": "success",
@@ -1,16 +1,21 @@
 from fastapi import APIRouter, Request, Depends, HTTPException, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Dict, Optional, Any
 from services.auth_service import verify_token
-from models.chatbot_model import ChatSession, ChatRequest, ChatMessage
+from models.chatbot_model import ChatSession, ChatSessionPage, ChatMessagePage, ChatRequest, ChatMessage, BulkDeleteRequest
+from utils.sse import SSE_HEADERS
 import logging
 
 # Import the service that will be implemented later
 from services.chatbot_service import (
     get_user_sessions,
+    get_session_messages,
     process_chat_message,
-    delete_user_session  # Add this import
+    stream_chat_message,
+    delete_user_session,  # Add this import
+    delete_user_sessions,
+    get_cache_stats
 )
 
 # Setup logging
@@ -19,15 +24,19 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/chatbot")
 
 
-@router.get("/sessions", response_model=List[ChatSession])
-async def get_sessions(request: Request):
+@router.get("/sessions", response_model=ChatSessionPage)
+async def get_sessions(request: Request, limit: Optional[int] = None, cursor: Optional[str] = None):
     """
-    Get a list of all available sessions (active and inactive) for the current user.
+    Get a page of the current user's sessions, most recently updated first.
+    Only session metadata is returned; pass `next_cursor` back as `cursor` to
+    fetch the next page.
     """
     try:
         user_id = request.state.user["uid"]
-        sessions = await get_user_sessions(user_id=user_id, request=request)
+        sessions = await get_user_sessions(user_id=user_id, request=request, limit=limit, cursor=cursor)
         return JSONResponse(content=sessions, status_code=200)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting sessions: {str(e)}")
         raise HTTPException(
@@ -36,6 +45,19 @@ async def get_sessions(request: Request):
         )
 
 
+@router.get("/session/{session_id}/messages", response_model=ChatMessagePage)
+async def get_messages(session_id: str, request: Request, limit: Optional[int] = None, cursor: Optional[str] = None):
+    """
+    Get a page of a session's messages, oldest first. Pass `next_cursor` back
+    as `cursor` to fetch the next page.
+    """
+    user_id = request.state.user["uid"]
+    messages = await get_session_messages(
+        user_id=user_id, session_id=session_id, request=request, limit=limit, cursor=cursor
+    )
+    return JSONResponse(content=messages, status_code=200)
+
+
 @router.delete("/session/{session_id}")
 async def delete_session(session_id: str, request: Request):
     """
@@ -45,6 +67,8 @@ async def delete_session(session_id: str, request: Request):
         user_id = request.state.user["uid"]
         result = await delete_user_session(user_id=user_id, session_id=session_id, request=request)
         return JSONResponse(content=result, status_code=200)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error deleting session: {str(e)}")
         raise HTTPException(
@@ -53,6 +77,35 @@ async def delete_session(session_id: str, request: Request):
         )
 
 
+@router.post("/sessions/delete")
+async def delete_sessions(delete_request: BulkDeleteRequest, request: Request):
+    """
+    Delete several sessions by ID. Returns the IDs that were deleted and the
+    ones that did not name an existing session.
+    """
+    try:
+        user_id = request.state.user["uid"]
+        result = await delete_user_sessions(user_id=user_id, session_ids=delete_request.session_ids, request=request)
+        return JSONResponse(content=result, status_code=200)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error deleting sessions: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to delete sessions: {str(e)}"
+        )
+
+
+@router.get("/cache/stats")
+async def cache_stats(request: Request):
+    """
+    Hit ratios and eviction counts of the session and history caches on the
+    worker that serves the request.
+    """
+    return JSONResponse(content=get_cache_stats(), status_code=200)
+
+
 @router.post("/chat")
 async def chat(
     chat_request: ChatRequest, 
@@ -76,4 +129,33 @@ async def chat(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Chat processing failed: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+
+@router.post("/chat/stream")
+async def chat_stream(
+    chat_request: ChatRequest, 
+    request: Request, 
+):
+    """
+    Send a message and stream the response as Server-Sent Events.
+    Emits a `session` event with the session ID, `token` events as the reply is
+    generated, and a final `done` event with the complete message.
+    """
+    try:
+        user_id = request.state.user["uid"]
+        stream = await stream_chat_message(
+            user_id=user_id,
+            message=chat_request.message,
+            session_id=chat_request.session_id,
+            request=request
+        )
+        return StreamingResponse(stream, media_type="text/event-stream", headers=SSE_HEADERS)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in chat stream: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Chat processing failed: {str(e)}"
+        )
@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Request , File , UploadFile
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Request , File , UploadFile, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
 
 from models.summarizer_model import Summarizermodel
 from services import summarizer_service
+from config.settings import get_settings
+from utils.sse import SSE_HEADERS, with_heartbeat
 
 
 
+settings = get_settings()
 router = APIRouter(prefix="/summarizer")
 
 @router.get("/text")
@@ -21,5 +24,35 @@ async def summarize_file(request: Request, file: UploadFile = File(...)):
     try:
         result = await summarizer_service.summarize_file(file=file, request=request)
         return JSONResponse(content=result, status_code=200)
+    except HTTPException as e:
+        return JSONResponse(content={"status": "error", "message": e.detail}, status_code=e.status_code)
     except Exception as e:
-        return JSONResponse(content={"status": "error", "message": str(e)}, status_code=500)
\ No newline at end of file
+        return JSONResponse(content={"status": "error", "message": str(e)}, status_code=500)
+
+@router.post("/text/stream")
+async def stream_summarize_text(user_input: Summarizermodel, request: Request):
+    """Summarize text, streaming map progress and the reduce step's tokens as SSE"""
+    try:
+        stream = await summarizer_service.stream_summarize_text(user_input=user_input, request=request)
+        return StreamingResponse(
+            with_heartbeat(stream, settings.summarizer.heartbeat_interval),
+            media_type="text/event-stream",
+            headers=SSE_HEADERS
+        )
+    except Exception as e:
+        return JSONResponse(content={"status": "error", "message": str(e)}, status_code=500)
+
+@router.post("/file/stream")
+async def stream_summarize_file(request: Request, file: UploadFile = File(...)):
+    """Summarize a PDF or TXT file, streaming map progress and the reduce step's tokens as SSE"""
+    try:
+        stream = await summarizer_service.stream_summarize_file(file=file, request=request)
+        return StreamingResponse(
+            with_heartbeat(stream, settings.summarizer.heartbeat_interval),
+            media_type="text/event-stream",
+            headers=SSE_HEADERS
+        )
+    except HTTPException as e:
+        return JSONResponse(content={"status": "error", "message": e.detail}, status_code=e.status_code)
+    except Exception as e:
+        return JSONResponse(content={"status": "error", "message": str(e)}, status_code=500)
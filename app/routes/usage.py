@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+from typing import Optional
+
+from services.usage_service import get_user_usage
+
+router = APIRouter(prefix="/usage")
+
+
+@router.get("")
+async def get_usage(request: Request, days: Optional[int] = None):
+    """
+    Tokens, cost, latency and time to first token of the current user's LLM
+    calls over the last `days` days, by day, model and route.
+    """
+    usage = await get_user_usage(request.state.user["uid"], request.app.state.redis, days)
+    return JSONResponse(content=usage, status_code=200)
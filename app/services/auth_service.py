@@ -1,18 +1,25 @@
 import firebase_admin
-from firebase_admin import credentials, auth, firestore
-from fastapi import Depends, HTTPException, status
+from firebase_admin import credentials, auth
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import os
 from typing import Dict, Optional
 from config.settings import get_settings
+from services.token_verifier import token_verifier
+from repositories.user_repository import user_repository
+from services.profile_cache import profile_cache
 
 # Get application settings
 settings = get_settings()
 
-# Initialize Firebase Admin
-cred = credentials.Certificate(settings.firebase.credentials_path)
-firebase_app = firebase_admin.initialize_app(cred) 
-db = firestore.client()
+# Initialize Firebase Admin, unless the process already has (the load-test
+# server does so with stand-in credentials; see loadtest/server.py)
+try:
+    firebase_app = firebase_admin.get_app()
+except ValueError:
+    cred = credentials.Certificate(settings.firebase.credentials_path)
+    firebase_app = firebase_admin.initialize_app(cred)
 
 security = HTTPBearer()
 
@@ -20,7 +27,8 @@ security = HTTPBearer()
 async def register_user(email: str, password: str, display_name: str = None) -> Dict:
     """Register a new user with email and password"""
     try:
-        user = auth.create_user(
+        user = await run_in_threadpool(
+            auth.create_user,
             email=email,
             password=password,
             display_name=display_name,
@@ -28,13 +36,12 @@ async def register_user(email: str, password: str, display_name: str = None) ->
         )
         
         # Create user profile in Firestore
-        user_ref = db.collection('users').document(user.uid)
-        user_ref.set({
+        await user_repository.create_profile(user.uid, {
             'email': email,
             'displayName': display_name or '',
-            'createdAt': firestore.SERVER_TIMESTAMP,
             'role': 'user'
         })
+        await profile_cache.invalidate(user.uid)
         
         return {
             "status": "success",
@@ -47,16 +54,13 @@ async def register_user(email: str, password: str, display_name: str = None) ->
             "message": str(e)
         }
 
-async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Dict:
-    """Verify Firebase ID token"""
+async def verify_token(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)) -> Dict:
+    """Verify Firebase ID token, reusing the user already verified by the middleware"""
+    user = getattr(request.state, "user", None)
+    if user is not None:
+        return user
     try:
-        token = credentials.credentials
-        decoded_token = auth.verify_id_token(token)
-        return {
-            "uid": decoded_token["uid"],
-            "email": decoded_token.get("email", ""),
-            "role": decoded_token.get("role", "user")
-        }
+        return await token_verifier.verify(credentials.credentials)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -84,13 +88,12 @@ async def refresh_token(refresh_token: str) -> Dict:
 async def get_user_profile(user_id: str) -> Dict:
     """Get user profile from Firestore"""
     try:
-        user_ref = db.collection('users').document(user_id)
-        user_doc = user_ref.get()
+        profile = await profile_cache.get(user_id, user_repository.get_profile)
         
-        if user_doc.exists:
+        if profile is not None:
             return {
                 "status": "success",
-                "profile": user_doc.to_dict()
+                "profile": profile
             }
         else:
             return {
@@ -110,8 +113,8 @@ async def update_user_profile(user_id: str, profile_data: Dict) -> Dict:
         if 'role' in profile_data:
             del profile_data['role']
             
-        user_ref = db.collection('users').document(user_id)
-        user_ref.update(profile_data)
+        await user_repository.update_profile(user_id, profile_data)
+        await profile_cache.invalidate(user_id)
         
         return {
             "status": "success",
@@ -0,0 +1,170 @@
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+import logging
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from config.settings import get_settings
+from utils.llm import count_tokens
+from services.chat_writer import ChatWriteBuffer
+from services.history_cache import HistoryCache
+from repositories.chat_repository import ChatRepository, chat_repository, message_tokens, session_version
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+MESSAGE_TYPES = {HumanMessage: "human", AIMessage: "ai", SystemMessage: "system"}
+MESSAGE_CLASSES = {"human": HumanMessage, "ai": AIMessage, "system": SystemMessage}
+
+
+def message_to_dict(message: BaseMessage) -> Dict:
+    """
+    Convert a LangChain message to the stored message document. The `seq`
+    field is assigned when the message is written.
+    """
+    message_type = MESSAGE_TYPES.get(type(message))
+    if message_type is None:
+        raise ValueError(f"Unsupported message type: {type(message)}")
+    return {
+        "type": message_type,
+        "content": message.content,
+        "timestamp": datetime.now().isoformat(),
+        "tokens": count_tokens(message.content)
+    }
+
+
+def dict_to_message(message_dict: Dict) -> Optional[BaseMessage]:
+    message_class = MESSAGE_CLASSES.get(message_dict["type"])
+    return message_class(content=message_dict["content"]) if message_class else None
+
+
+async def append_session_messages(user_id: str, session_id: str, message_dicts: List[Dict], repository: ChatRepository = chat_repository):
+    """Append messages to a session and extend its cached history window to match"""
+    result = await repository.append_messages(user_id, session_id, message_dicts)
+    if result is not None:
+        previous_version, version, stored = result
+        await history_cache.extend(
+            (user_id, session_id), previous_version, version, stored,
+            settings.chat.history_token_budget
+        )
+
+
+async def write_buffered_messages(key, message_dicts: List[Dict]):
+    """Flush callback for the write-behind buffer; `key` is `(user_id, session_id)`"""
+    user_id, session_id = key
+    await append_session_messages(user_id, session_id, message_dicts)
+
+
+# History windows served between turns; see HistoryCache
+history_cache = HistoryCache(
+    to_message=dict_to_message,
+    tokens=message_tokens,
+    maxsize=settings.chat.history_cache_size,
+    idle_ttl=settings.chat.history_cache_idle_ttl,
+    redis_ttl=settings.chat.history_cache_redis_ttl
+)
+
+
+# Turn persistence is written behind the request path; see ChatWriteBuffer
+chat_write_buffer = ChatWriteBuffer(
+    write=write_buffered_messages,
+    flush_interval=settings.chat.write_flush_interval,
+    max_pending=settings.chat.write_max_pending,
+    max_batch=settings.chat.write_max_batch,
+    write_behind=settings.chat.write_behind
+)
+
+
+def history_messages(entry: Dict) -> List[BaseMessage]:
+    """
+    Prompt history for a cached entry: the rolling summary, then the messages
+    not folded into it yet, then the window
+    """
+    result = []
+    if entry["summary"]:
+        result.append(SystemMessage(content=f"Summary of the earlier conversation:\n{entry['summary']}"))
+    result.extend(message for message in entry["messages"] if message is not None)
+    return result
+
+
+class CustomFirestoreChatHistory:
+    """
+    Chat history stored as ordered documents in the session's `messages`
+    subcollection. Reads return the rolling summary of older turns followed
+    by the most recent messages that fit in the configured token budget.
+    Messages between the two are sent verbatim until a compaction folds them
+    into the summary, so no turn drops out of the prompt.
+
+    Storage goes through the async Firestore client, which belongs to the
+    app's event loop, so this only provides the async half of LangChain's
+    chat history interface (`aget_messages`, `aadd_messages`, `aclear`) and
+    deliberately does not subclass BaseChatMessageHistory. Chains built on it
+    must be run with `ainvoke`/`astream`.
+
+    When a read finds at least `history_fold_min_tokens` outside the window
+    and not yet summarized, `on_fold_due(user_id, session_id, summary,
+    summarized_count, window_start)` is called so the caller can fold them.
+    """
+
+    def __init__(
+        self,
+        user_id,
+        session_id,
+        repository: ChatRepository = chat_repository,
+        on_fold_due: Optional[Callable[[str, str, str, int, int], None]] = None
+    ):
+        self.user_id = user_id
+        self.session_id = session_id
+        self.repository = repository
+        self.on_fold_due = on_fold_due
+
+    async def load_session(self) -> Optional[Dict]:
+        return await self.repository.load_session(self.user_id, self.session_id)
+
+    async def recent_messages(self, min_seq: int, token_budget: int) -> List[Dict]:
+        return await self.repository.recent_messages(
+            self.user_id, self.session_id, min_seq, token_budget, settings.chat.history_page_size
+        )
+
+    async def messages_between(self, start_seq: int, end_seq: int) -> List[Dict]:
+        return await self.repository.messages_between(self.user_id, self.session_id, start_seq, end_seq)
+
+    async def aadd_messages(self, messages):
+        """Queue messages in the write-behind buffer; used for chat turns"""
+        await chat_write_buffer.add(
+            (self.user_id, self.session_id),
+            [message_to_dict(message) for message in messages]
+        )
+
+    async def aget_messages(self):
+        """
+        Flush this session's queued writes first so the next turn reads them,
+        then serve the window from the history cache if it is still current.
+        """
+        key = (self.user_id, self.session_id)
+        await chat_write_buffer.flush_key(key)
+        data = await self.load_session()
+        if data is None:
+            return []
+
+        version = session_version(data)
+        summarized_count = data.get("summarized_count", 0)
+        entry = await history_cache.get(key, version)
+        if entry is None:
+            window = await self.recent_messages(summarized_count, settings.chat.history_token_budget)
+            window_start = window[0]["seq"] if window else data.get("message_count", 0)
+            # Read once per window build; later turns track them in the cache
+            unfolded = await self.messages_between(summarized_count, window_start) if window_start > summarized_count else []
+            entry = await history_cache.put(key, version, data.get("summary", ""), window, unfolded)
+
+        if self.on_fold_due is not None and entry["unfolded_tokens"] >= settings.chat.history_fold_min_tokens:
+            window_start = entry["window"][0]["seq"] if entry["window"] else data.get("message_count", 0)
+            self.on_fold_due(self.user_id, self.session_id, entry["summary"], summarized_count, window_start)
+        return history_messages(entry)
+
+    async def aclear(self):
+        key = (self.user_id, self.session_id)
+        await chat_write_buffer.flush_key(key)
+        await self.repository.clear_session(self.user_id, self.session_id)
+        await history_cache.invalidate(key)
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, List, Optional
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+
+class ChatWriteBufferFull(Exception):
+    """Too many messages are queued and they cannot be written right now"""
+
+
+class ChatWriteBuffer:
+    """
+    Write-behind buffer for chat messages.
+
+    Messages are queued per session and written off the request path by a
+    background task, so a whole turn (and anything else queued for the same
+    session) lands in one transactional write. `write(key, items)` is a
+    coroutine function.
+
+    - Flushes are bounded: each cycle writes at most `max_batch` sessions, and
+      once `max_pending` messages are queued, writers flush inline instead of
+      queuing more. If that flush fails, `add` raises ChatWriteBufferFull.
+    - Failed writes are put back at the end of the queue and retried, so a
+      session that keeps failing does not hold up the others.
+    - `flush_key` lets a reader flush a session before reading it, which gives
+      read-your-writes for the next turn on this worker only. With more than
+      one worker, pass `write_behind=False`: `add` then writes through before
+      returning, so the turn is stored before the response completes.
+    - `close` drains the queue on shutdown.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[Hashable, List[Any]], Awaitable[None]],
+        flush_interval: float,
+        max_pending: int,
+        max_batch: int,
+        write_behind: bool = True,
+        lock_stripes: int = 64
+    ):
+        self._write = write
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_batch = max_batch
+        self.write_behind = write_behind
+
+        self._pending: "OrderedDict[Hashable, List[Any]]" = OrderedDict()
+        self._pending_count = 0
+        # Striped locks keep flushes of one session in order without a lock per session
+        self._locks = [asyncio.Lock() for _ in range(lock_stripes)]
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending_count(self) -> int:
+        return self._pending_count
+
+    def _lock(self, key: Hashable) -> asyncio.Lock:
+        return self._locks[hash(key) % len(self._locks)]
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stop the background flusher and write everything still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        while self._pending:
+            if not await self.flush():
+                logger.error(f"Dropping {self._pending_count} unwritten chat messages on shutdown")
+                break
+
+    async def add(self, key: Hashable, items: List[Any]):
+        """
+        Queue items for a session, or write them immediately when write-behind
+        is off or the flusher is not running
+        """
+        if not self.write_behind:
+            async with self._lock(key):
+                await self._write(key, items)
+            return
+
+        while self._pending_count >= self.max_pending:
+            if not await self.flush():
+                raise ChatWriteBufferFull(f"{self._pending_count} chat messages are waiting to be written")
+
+        self._pending.setdefault(key, []).extend(items)
+        self._pending_count += len(items)
+        if self._task is None:
+            await self.flush_key(key)
+        else:
+            self._wakeup.set()
+
+    async def flush_key(self, key: Hashable):
+        """Write everything queued for one session; raises if the write fails"""
+        async with self._lock(key):
+            items = self._pending.pop(key, None)
+            if not items:
+                return
+            self._pending_count -= len(items)
+            try:
+                await self._write(key, items)
+            except BaseException:
+                # Put the items back ahead of anything queued since for this
+                # session, and the session behind the others
+                self._pending[key] = items + self._pending.get(key, [])
+                self._pending.move_to_end(key)
+                self._pending_count += len(items)
+                raise
+
+    async def flush(self) -> bool:
+        """Write up to `max_batch` sessions; returns False if any write failed"""
+        keys = list(self._pending)[:self.max_batch]
+        results = await asyncio.gather(*(self.flush_key(key) for key in keys), return_exceptions=True)
+        failures = [result for result in results if isinstance(result, Exception)]
+        for failure in failures:
+            logger.warning(f"Failed to flush chat messages, will retry: {str(failure)}")
+        return not failures
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            # Give the rest of the turn a moment to join the same write
+            await asyncio.sleep(self.flush_interval)
+            self._wakeup.clear()
+            while self._pending:
+                if not await self.flush():
+                    await asyncio.sleep(self.flush_interval)
+                    self._wakeup.set()
+                    break
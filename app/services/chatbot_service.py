@@ -1,24 +1,57 @@
 from fastapi import Request, HTTPException, status
 from typing import List, Dict, Optional, Any
 import uuid
+import asyncio
 from datetime import datetime
 import logging
-from utils.llm import LLM
+from utils.llm import model_registry
+from config.settings import get_settings
+from utils.sse import format_sse
+from utils.lru import LRUCache
+from utils.usage import usage_config
 
 # Updated imports for modern LangChain
 from langchain_google_firestore import FirestoreChatMessageHistory
-from firebase_admin import firestore
-from langchain_core.runnables import RunnableWithMessageHistory
+from langchain_core.runnables import ConfigurableFieldSpec, RunnableWithMessageHistory
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.messages import AIMessage, HumanMessage
+from services.session_registry import session_registry
+from services.chat_history import (
+    CustomFirestoreChatHistory,
+    chat_write_buffer,
+    history_cache
+)
+from repositories.chat_repository import InvalidCursorError, chat_repository
 
 # Setup logging
 logger = logging.getLogger(__name__)
 
+settings = get_settings()
+
+# Prompt used to fold older turns into the session's rolling summary
+SUMMARY_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "Progressively summarize the conversation, extending the current summary with the new lines. "
+               "Keep facts, names, decisions and open questions. Return only the new summary."),
+    ("human", "Current summary:\n{summary}\n\nNew lines of conversation:\n{new_lines}\n\nNew summary:")
+])
+
+ROLE_NAMES = {"human": "Human", "ai": "AI", "system": "System"}
+
+# Fields read when listing sessions; messages are served per session
+SESSION_LIST_FIELDS = ["name", "created_at", "updated_at", "message_count"]
+
 class SessionManager:
     def __init__(self):
-        self.sessions = {}
-        self.firestore_client = firestore.client()
+        # Sessions recently confirmed to exist. Entries expire a few seconds
+        # after they were confirmed, however often they are used, so a session
+        # deleted on another worker is rechecked against the registry soon
+        self.sessions = LRUCache(
+            maxsize=settings.chat.session_cache_size,
+            ttl=settings.chat.session_cache_ttl,
+            name="sessions"
+        )
+        self.repository = chat_repository
         
         # Create a reusable chat prompt template
         self.prompt = ChatPromptTemplate.from_messages([
@@ -28,161 +61,195 @@ class SessionManager:
         ])
         
         # Create the base runnable chain
-        llm = LLM().get_openai_model()
+        llm = model_registry.get_model()
         self.base_chain = self.prompt | llm | StrOutputParser()
+        self.summary_chain = SUMMARY_PROMPT | llm | StrOutputParser()
+        
+        # One history-aware chain for every session; the session is picked per call.
+        # Its history is async-only (see CustomFirestoreChatHistory), so run it
+        # with ainvoke/astream.
+        self.chain = RunnableWithMessageHistory(
+            self.base_chain,
+            self.get_chat_history,
+            input_messages_key="input",
+            history_messages_key="history",
+            history_factory_config=[
+                ConfigurableFieldSpec(
+                    id="user_id",
+                    annotation=str,
+                    name="User ID",
+                    description="Owner of the chat session.",
+                    default="",
+                    is_shared=True
+                ),
+                ConfigurableFieldSpec(
+                    id="session_id",
+                    annotation=str,
+                    name="Session ID",
+                    description="Chat session to read and extend.",
+                    default="",
+                    is_shared=True
+                )
+            ]
+        )
+        
+        # Background history compactions in flight, by session
+        self.compactions: Dict[str, asyncio.Task] = {}
 
     def get_session(self, session_id, user_id):
-        cache_key = f"{user_id}:{session_id}"
-        if cache_key not in self.sessions:
-            # Create the runnable with message history
-            chain_with_history = RunnableWithMessageHistory(
-                self.base_chain,
-                lambda session_id: self.get_chat_history(user_id, session_id),
-                input_messages_key="input",
-                history_messages_key="history"
-            )
-            self.sessions[cache_key] = chain_with_history
-        
-        return self.sessions[cache_key]
+        """
+        Return the shared history-aware chain and mark the session as active.
+        Invoke it with `session_config(user_id, session_id, route)`.
+        """
+        self.add_sessionid_to_sessions(session_id, user_id)
+        return self.chain
     
     def add_sessionid_to_sessions(self, session_id, user_id):
         cache_key = f"{user_id}:{session_id}"
-        if cache_key not in self.sessions:
-            # Create the runnable with message history
-            chain_with_history = RunnableWithMessageHistory(
-                self.base_chain,
-                lambda session_id: self.get_chat_history(user_id, session_id),
-                input_messages_key="input",
-                history_messages_key="history"
-            )
-            self.sessions[cache_key] = chain_with_history
+        if self.sessions.get(cache_key) is None:
+            self.sessions.set(cache_key, True)
         
     
     def get_chat_history(self, user_id, session_id):
         """Get a FirestoreChatMessageHistory for the specified user and session"""
-        collection_path = f"users/{user_id}/chat_sessions"
         return CustomFirestoreChatHistory(
             user_id=user_id,
             session_id=session_id,
-            client=self.firestore_client
+            repository=self.repository,
+            on_fold_due=self.schedule_history_compaction
         )
         
-    def create_session(self, user_id, session_id, name=None):
-        """Create a new session in Firestore"""
+    async def create_session(self, user_id, session_id, redis, name=None):
+        """Create a new session in Firestore and register it for every worker"""
         now = datetime.now().isoformat()
         session_name = name or f"Chat {now}"
         
         # Create session document
-        self.firestore_client.collection("users").document(user_id).collection("chat_sessions").document(session_id).set({
+        await self.repository.create_session(user_id, session_id, {
             "name": session_name,
             "created_at": now,
             "updated_at": now,
-            "messages": []
+            "message_count": 0,
+            "summary": "",
+            "summarized_count": 0
         })
         self.add_sessionid_to_sessions(session_id, user_id)
+        await session_registry.register(redis, user_id, session_id, {"name": session_name, "created_at": now})
         
         return session_id
 
-    def list_user_sessions(self, user_id):
-        """List all sessions for a specific user"""
-        sessions = self.firestore_client.collection("users").document(user_id).collection("chat_sessions").stream()
-        result = []
+    async def list_user_sessions(self, user_id, limit=None, cursor=None):
+        """
+        List a user's sessions, most recently updated first. Only the listing
+        fields are read, never the messages. Returns the page and the cursor
+        of the next one, or None when there are no more.
+        """
+        sessions, next_cursor = await self.repository.list_sessions(user_id, SESSION_LIST_FIELDS, limit, cursor)
+        for session_data in sessions:
+            session_data.setdefault("message_count", 0)
+        return sessions, next_cursor
+    
+    async def list_session_messages(self, user_id, session_id, limit, after=None):
+        """
+        Page through a session's stored messages oldest first, starting after
+        sequence number `after`. Returns None if the session does not exist.
+        """
+        if await self.get_chat_history(user_id, session_id).load_session() is None:
+            return None
         
-        for session in sessions:
-            session_data = session.to_dict()
-            session_data["id"] = session.id
-            self.add_sessionid_to_sessions(session.id, user_id)
-            result.append(session_data)
-            
-        return result
+        page, next_after = await self.repository.list_messages(user_id, session_id, limit, after)
+        messages = [
+            {
+                "role": message_dict.get("type"),
+                "content": message_dict.get("content"),
+                "timestamp": message_dict.get("timestamp"),
+                "seq": message_dict.get("seq")
+            }
+            for message_dict in page
+        ]
+        return messages, str(next_after) if next_after is not None else None
     
-    def check_session_exists(self, user_id, session_id):
-        """Check if a session exists for a specific user"""
+    async def check_session_exists(self, user_id, session_id, redis):
+        """
+        Check if a session exists for a specific user: this worker's
+        short-lived cache first, then the shared Redis registry, then
+        Firestore. Deletes clear the registry, so every worker notices them
+        within `session_cache_ttl`.
+        """
         cache_key = f"{user_id}:{session_id}"
-        in_memory = cache_key in self.sessions
-        return in_memory        
-
-# Add this custom chat history class
-from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
-from langchain_core.chat_history import BaseChatMessageHistory
-
-class CustomFirestoreChatHistory(BaseChatMessageHistory):
-    def __init__(self, user_id, session_id, client):
-        self.user_id = user_id
-        self.session_id = session_id
-        self.client = client
-        self.doc_ref = client.collection("users").document(user_id).collection("chat_sessions").document(session_id)
-    
-    def add_messages(self, messages):
-        for message in messages:
-            self.add_message(message)
-    
-    def add_message(self, message):
-        # Convert message to a plain dict
-        if isinstance(message, HumanMessage):
-            message_dict = {
-                "type": "human",
-                "content": message.content,
-                "timestamp": datetime.now().isoformat()
-            }
-        elif isinstance(message, AIMessage):
-            message_dict = {
-                "type": "ai",
-                "content": message.content,
-                "timestamp": datetime.now().isoformat()
-            }
-        elif isinstance(message, SystemMessage):
-            message_dict = {
-                "type": "system",
-                "content": message.content,
-                "timestamp": datetime.now().isoformat()
-            }
-        else:
-            raise ValueError(f"Unsupported message type: {type(message)}")
+        if self.sessions.get(cache_key) is not None:
+            return True
         
-        # Add the message to Firestore
-        self.doc_ref.update({
-            "messages": firestore.ArrayUnion([message_dict]),
-            "updated_at": datetime.now().isoformat()
-        })
-    
-    def clear(self):
-        self.doc_ref.update({
-            "messages": [],
-            "updated_at": datetime.now().isoformat()
-        })
+        if not await session_registry.exists(redis, user_id, session_id):
+            data = await self.repository.get_session(user_id, session_id, field_paths=["name", "created_at"])
+            if data is None:
+                return False
+            await session_registry.register(redis, user_id, session_id, {
+                "name": data.get("name", ""),
+                "created_at": data.get("created_at", "")
+            })
+        
+        self.sessions.set(cache_key, True)
+        return True
     
-    @property
-    def messages(self):
-        # Get the document
-        doc = self.doc_ref.get()
-        if not doc.exists:
-            return []
+    async def compact_history(self, user_id, session_id, summary, summarized_count, window_start):
+        """
+        Fold the messages from `summarized_count` up to the start of the token
+        window into the session's rolling summary. The summary is only written
+        if no other compaction advanced `summarized_count` in the meantime.
+        """
+        pending = await self.repository.messages_between(user_id, session_id, summarized_count, window_start)
+        if not pending:
+            return
+        
+        new_lines = "\n".join(f"{ROLE_NAMES.get(msg['type'], msg['type'])}: {msg['content']}" for msg in pending)
+        new_summary = await self.summary_chain.ainvoke(
+            {"summary": summary or "(none)", "new_lines": new_lines},
+            config=usage_config(user_id, "chat_compaction")
+        )
         
-        # Extract messages
-        data = doc.to_dict()
-        messages_data = data.get("messages", [])
+        await self.repository.save_summary(user_id, session_id, summarized_count, new_summary, window_start)
+    
+    def schedule_history_compaction(self, user_id, session_id, summary, summarized_count, window_start):
+        """
+        Start a background compaction unless one is already running for the
+        session. Called by the chat history once enough tokens have left the
+        window; see CustomFirestoreChatHistory.
+        """
+        cache_key = f"{user_id}:{session_id}"
+        if cache_key in self.compactions:
+            return
         
-        # Convert to LangChain message objects
-        result = []
-        for msg in messages_data:
-            if msg["type"] == "human":
-                result.append(HumanMessage(content=msg["content"]))
-            elif msg["type"] == "ai":
-                result.append(AIMessage(content=msg["content"]))
-            elif msg["type"] == "system":
-                result.append(SystemMessage(content=msg["content"]))
+        def on_done(task):
+            self.compactions.pop(cache_key, None)
+            if not task.cancelled() and task.exception():
+                logger.warning(f"History compaction failed for session {session_id}: {str(task.exception())}")
         
-        return result
+        task = asyncio.create_task(self.compact_history(user_id, session_id, summary, summarized_count, window_start))
+        self.compactions[cache_key] = task
+        task.add_done_callback(on_done)
 
 # Initialize globally
 session_manager = SessionManager()
 
-async def get_user_sessions(user_id: str, request: Request):
-    """Get all chat sessions for a user"""
+def page_size(limit: Optional[int], default: int) -> int:
+    """Clamp a requested page size to the configured maximum"""
+    return min(max(limit or default, 1), settings.chat.max_page_size)
+
+async def get_user_sessions(user_id: str, request: Request, limit: Optional[int] = None, cursor: Optional[str] = None):
+    """Get one page of a user's chat sessions, most recently updated first"""
     try:
-        sessions = session_manager.list_user_sessions(user_id)
-        return sessions
+        sessions, next_cursor = await session_manager.list_user_sessions(
+            user_id,
+            page_size(limit, settings.chat.sessions_page_size),
+            cursor
+        )
+        return {"sessions": sessions, "next_cursor": next_cursor}
+    except InvalidCursorError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
     except Exception as e:
         logger.error(f"Error getting sessions: {str(e)}")
         raise HTTPException(
@@ -190,21 +257,67 @@ async def get_user_sessions(user_id: str, request: Request):
             detail=f"Failed to retrieve sessions: {str(e)}"
         )
 
+async def get_session_messages(user_id: str, session_id: str, request: Request, limit: Optional[int] = None, cursor: Optional[str] = None):
+    """Get one page of a session's messages, oldest first"""
+    try:
+        after = int(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+    
+    try:
+        # Include turns still waiting in the write-behind buffer
+        await chat_write_buffer.flush_key((user_id, session_id))
+        page = await session_manager.list_session_messages(
+            user_id,
+            session_id,
+            page_size(limit, settings.chat.messages_page_size),
+            after
+        )
+    except Exception as e:
+        logger.error(f"Error getting session messages: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to retrieve messages: {str(e)}"
+        )
+    
+    if page is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Session with ID {session_id} not found"
+        )
+    messages, next_cursor = page
+    return {"session_id": session_id, "messages": messages, "next_cursor": next_cursor}
+
+def session_config(user_id: str, session_id: str, route: str) -> Dict[str, Any]:
+    """
+    Per-call config that points the shared chain at one session's history
+    and attributes its LLM usage to the user and route
+    """
+    return {"configurable": {"user_id": user_id, "session_id": session_id}, **usage_config(user_id, route)}
+
+async def resolve_session(user_id: str, session_id: Optional[str], redis) -> str:
+    """Validate the requested session, or create a new one if none was given"""
+    if session_id and not await session_manager.check_session_exists(user_id, session_id, redis):
+        # If session exists, check if it's active
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Session is not available" 
+        )
+        
+    if not session_id:
+        # Create a new session if none specified
+        session_id = str(uuid.uuid4())
+        await session_manager.create_session(user_id, session_id, redis)
+    
+    return session_id
+
 async def process_chat_message(user_id: str, message: str, session_id: Optional[str], request: Request):
     """Process a chat message using the specified session or create a new one"""
     try:
-        
-        if session_id and not session_manager.check_session_exists(user_id, session_id):
-            # If session exists, check if it's active
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Session is not available" 
-            )
-            
-        if not session_id:
-            # Create a new session if none specified
-            session_id = str(uuid.uuid4())
-            session_manager.create_session(user_id, session_id)
+        session_id = await resolve_session(user_id, session_id, request.app.state.redis)
             
         # Get the runnable with message history
         chain = session_manager.get_session(session_id, user_id)
@@ -212,18 +325,9 @@ async def process_chat_message(user_id: str, message: str, session_id: Optional[
         # Process the message with session context
         response = await chain.ainvoke(
             {"input": message},
-            config={"configurable": {"session_id": session_id}}
+            config=session_config(user_id, session_id, "chat")
         )
         
-        # Update the session's last updated timestamp
-        now = datetime.now().isoformat()
-        try:
-            session_manager.firestore_client.collection("users").document(user_id).collection("chat_sessions").document(session_id).update({
-                "updated_at": now
-            })
-        except Exception as e:
-            logger.warning(f"Failed to update session timestamp: {str(e)}")
-        
         return {
             "status": "success",
             "message": response,
@@ -236,27 +340,81 @@ async def process_chat_message(user_id: str, message: str, session_id: Optional[
             detail=f"Chat processing failed: {str(e)}"
         )
 
+async def stream_chat_message(user_id: str, message: str, session_id: Optional[str], request: Request):
+    """
+    Stream the reply to a chat message as Server-Sent Events.
+    
+    The session is resolved before streaming starts so that errors still map to
+    HTTP status codes. RunnableWithMessageHistory persists the turn when the
+    stream completes; if the client disconnects first, the partial reply is
+    persisted here instead. A stream that fails persists nothing, so a
+    truncated reply never becomes history.
+    """
+    session_id = await resolve_session(user_id, session_id, request.app.state.redis)
+    chain = session_manager.get_session(session_id, user_id)
+    
+    async def event_stream():
+        chunks = []
+        completed = False
+        disconnected = False
+        try:
+            yield format_sse({"session_id": session_id}, event="session")
+            async for chunk in chain.astream(
+                {"input": message},
+                config=session_config(user_id, session_id, "chat_stream")
+            ):
+                chunks.append(chunk)
+                yield format_sse({"content": chunk}, event="token")
+            completed = True
+            yield format_sse({"session_id": session_id, "message": "".join(chunks)}, event="done")
+        except asyncio.CancelledError:
+            logger.info(f"Client disconnected from chat stream for session {session_id}")
+            disconnected = True
+            raise
+        except Exception as e:
+            logger.error(f"Error streaming chat message: {str(e)}")
+            yield format_sse({"detail": f"Chat processing failed: {str(e)}"}, event="error")
+        finally:
+            if disconnected and not completed and chunks:
+                history = session_manager.get_chat_history(user_id, session_id)
+                await asyncio.shield(history.aadd_messages(
+                    [HumanMessage(content=message), AIMessage(content="".join(chunks))]
+                ))
+    
+    return event_stream()
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    """Hit ratios and eviction counts of this worker's chat caches"""
+    return {
+        "sessions": session_manager.sessions.stats(),
+        "history": history_cache.stats()
+    }
+
+
+async def forget_session(user_id: str, session_id: str, redis):
+    """Drop a deleted session from this worker's caches and the shared registry"""
+    session_manager.sessions.pop(f"{user_id}:{session_id}", None)
+    await session_registry.remove(redis, user_id, session_id)
+    await history_cache.invalidate((user_id, session_id))
 
 async def delete_user_session(user_id: str, session_id: str, request: Request):
     """Delete a specific chat session for a user"""
     try:
         # Check if session exists
-        sessions = session_manager.list_user_sessions(user_id)
-        session_exists = any(s["id"] == session_id for s in sessions)
+        session = await session_manager.repository.get_session(user_id, session_id, field_paths=["name"])
         
-        if not session_exists:
+        if session is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Session with ID {session_id} not found"
             )
         
-        # Delete the session from Firestore
-        session_manager.firestore_client.collection("users").document(user_id).collection("chat_sessions").document(session_id).delete()
+        # Delete the session and its messages from Firestore
+        await session_manager.repository.delete_sessions(user_id, [session_id])
         
-        # Remove from cache if present
-        cache_key = f"{user_id}:{session_id}"
-        if cache_key in session_manager.sessions:
-            del session_manager.sessions[cache_key]
+        # Remove from caches if present
+        await forget_session(user_id, session_id, request.app.state.redis)
         
         return {
             "status": "success",
@@ -269,4 +427,38 @@ async def delete_user_session(user_id: str, session_id: str, request: Request):
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to delete session: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+async def delete_user_sessions(user_id: str, session_ids: List[str], request: Request):
+    """
+    Delete several of a user's sessions at once. IDs that do not name an
+    existing session are reported back instead of failing the request.
+    """
+    session_ids = list(dict.fromkeys(session_ids))
+    if len(session_ids) > settings.chat.max_bulk_delete:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.chat.max_bulk_delete} sessions can be deleted per request"
+        )
+    
+    try:
+        # One round-trip for every existence check
+        existing = await session_manager.repository.existing_sessions(user_id, session_ids)
+        deleted = [session_id for session_id in session_ids if session_id in existing]
+        await session_manager.repository.delete_sessions(user_id, deleted)
+        
+        await asyncio.gather(*(
+            forget_session(user_id, session_id, request.app.state.redis) for session_id in deleted
+        ))
+        
+        return {
+            "status": "success",
+            "deleted": deleted,
+            "not_found": [session_id for session_id in session_ids if session_id not in existing]
+        }
+    except Exception as e:
+        logger.error(f"Error deleting sessions: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to delete sessions: {str(e)}"
+        )
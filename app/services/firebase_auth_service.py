@@ -1,7 +1,7 @@
-import requests
-import json
+import httpx
 from fastapi import HTTPException, status
 from config.settings import get_settings
+from utils.http_client import request_with_retries
 import logging
 
 # Get application settings
@@ -15,11 +15,27 @@ class FirebaseAuthService:
     def __init__(self):
         self.api_key = settings.firebase.api_key
         
-        self.base_url = "https://identitytoolkit.googleapis.com/v1/accounts"
+        self.base_url = settings.firebase.auth_base_url.rstrip("/")
         self.auth_domain = settings.firebase.auth_domain
         logger.info("Firebase Auth Service initialized")
     
-    def sign_in_with_email_password(self, email: str, password: str):
+    async def _post(self, action: str, payload: dict, idempotent: bool = True) -> httpx.Response:
+        """
+        POST to an Identity Toolkit accounts endpoint on the shared HTTP client.
+        Actions that change the account pass `idempotent=False` so that they are
+        not replayed after a gateway error.
+        """
+        url = f"{self.base_url}:{action}"
+        logger.debug(f"Sending request to Firebase Auth API: {url}")
+        return await request_with_retries(
+            "POST",
+            url,
+            idempotent=idempotent,
+            params={"key": self.api_key},
+            json=payload
+        )
+    
+    async def sign_in_with_email_password(self, email: str, password: str):
         """
         Sign in a user with email and password using Firebase Auth REST API
         """
@@ -30,13 +46,8 @@ class FirebaseAuthService:
             "returnSecureToken": True
         }
         
-        url = f"{self.base_url}:signInWithPassword?key={self.api_key}"
-        
         try:
-            logger.debug(f"Sending request to Firebase Auth API: {url}")
-            # Add Content-Type header to ensure proper JSON parsing
-            headers = {"Content-Type": "application/json"}
-            response = requests.post(url, data=json.dumps(payload), headers=headers)
+            response = await self._post("signInWithPassword", payload)
             response_data = response.json()
             
             if response.status_code != 200:
@@ -50,14 +61,14 @@ class FirebaseAuthService:
             
             logger.info(f"User signed in successfully: {response_data.get('localId')}")
             return response_data
-        except requests.RequestException as e:
+        except (httpx.HTTPError, ValueError) as e:
             logger.error(f"Request to Firebase Auth API failed: {str(e)}", exc_info=True)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Authentication service unavailable: {str(e)}",
             )
     
-    def sign_up_with_email_password(self, email: str, password: str):
+    async def sign_up_with_email_password(self, email: str, password: str):
         """
         Sign up a new user with email and password using Firebase Auth REST API
         """
@@ -68,12 +79,8 @@ class FirebaseAuthService:
             "returnSecureToken": True
         }
         
-        url = f"{self.base_url}:signUp?key={self.api_key}"
-        
         try:
-            logger.debug(f"Sending request to Firebase Auth API: {url}")
-            headers = {"Content-Type": "application/json"}
-            response = requests.post(url, data=json.dumps(payload), headers=headers)
+            response = await self._post("signUp", payload, idempotent=False)
             response_data = response.json()
             
             if response.status_code != 200:
@@ -86,14 +93,14 @@ class FirebaseAuthService:
             
             logger.info(f"User signed up successfully: {response_data.get('localId')}")
             return response_data
-        except requests.RequestException as e:
+        except (httpx.HTTPError, ValueError) as e:
             logger.error(f"Request to Firebase Auth API failed: {str(e)}", exc_info=True)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Authentication service unavailable: {str(e)}",
             )
     
-    def update_profile(self, id_token: str, display_name: str = None, photo_url: str = None):
+    async def update_profile(self, id_token: str, display_name: str = None, photo_url: str = None):
         """
         Update user profile using Firebase Auth REST API
         """
@@ -108,12 +115,8 @@ class FirebaseAuthService:
         if photo_url:
             payload["photoUrl"] = photo_url
         
-        url = f"{self.base_url}:update?key={self.api_key}"
-        
         try:
-            logger.debug(f"Sending request to Firebase Auth API: {url}")
-            headers = {"Content-Type": "application/json"}
-            response = requests.post(url, data=json.dumps(payload), headers=headers)
+            response = await self._post("update", payload, idempotent=False)
             response_data = response.json()
             
             if response.status_code != 200:
@@ -126,14 +129,14 @@ class FirebaseAuthService:
             
             logger.info(f"User profile updated successfully: {response_data.get('localId')}")
             return response_data
-        except requests.RequestException as e:
+        except (httpx.HTTPError, ValueError) as e:
             logger.error(f"Request to Firebase Auth API failed: {str(e)}", exc_info=True)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Authentication service unavailable: {str(e)}",
             )
     
-    def sign_in_with_google(self, id_token: str):
+    async def sign_in_with_google(self, id_token: str):
         """
         Sign in or sign up a user with a Google ID token
         """
@@ -145,12 +148,8 @@ class FirebaseAuthService:
             "returnSecureToken": True
         }
         
-        url = f"https://identitytoolkit.googleapis.com/v1/accounts:signInWithIdp?key={self.api_key}"
-        
         try:
-            logger.debug(f"Sending request to Firebase Auth API: {url}")
-            headers = {"Content-Type": "application/json"}
-            response = requests.post(url, data=json.dumps(payload), headers=headers)
+            response = await self._post("signInWithIdp", payload)
             response_data = response.json()
             
             if response.status_code != 200:
@@ -164,7 +163,7 @@ class FirebaseAuthService:
             
             logger.info(f"User signed in with Google successfully: {response_data.get('localId')}")
             return response_data
-        except requests.RequestException as e:
+        except (httpx.HTTPError, ValueError) as e:
             logger.error(f"Request to Firebase Auth API failed: {str(e)}", exc_info=True)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -0,0 +1,206 @@
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from redis.exceptions import RedisError
+from utils.cache_keys import chat_history_key
+from utils.lru import LRUCache
+from utils.metrics import timed
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+# (updated_at, summarized_count) of the session document an entry was built from
+Version = List[Any]
+
+
+class HistoryCache:
+    """
+    Cache of chat history windows between turns, keyed by
+    `(user_id, session_id)`.
+
+    An entry holds the rolling summary and the message window as stored
+    dicts, plus the rebuilt message objects on this worker. Entries carry the
+    session's `updated_at` and `summarized_count` and are only served when
+    both still match the session document, so writes from other workers,
+    compactions and clears invalidate them. Writes extend the cached window
+    in place instead, on this worker and in Redis.
+
+    Messages that have left the window but are not in the summary yet are
+    kept as well (`unfolded`, with their total in `unfolded_tokens`), so they
+    still reach the prompt until a compaction folds them in, and callers can
+    tell when one is due without reading them again.
+
+    With a Redis client attached, entries are also shared between workers;
+    Redis errors are logged and treated as misses.
+    """
+
+    def __init__(
+        self,
+        to_message: Callable[[Dict], Any],
+        tokens: Callable[[Dict], int],
+        maxsize: int,
+        idle_ttl: float,
+        redis_ttl: int
+    ):
+        self.to_message = to_message
+        self.tokens = tokens
+        self.local = LRUCache(maxsize=maxsize, ttl=idle_ttl, idle=True, name="history")
+        self.redis_ttl = redis_ttl
+        self.redis = None
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def _with_messages(self, entry: Dict) -> Dict:
+        message_dicts = entry["unfolded"] + entry["window"]
+        return {**entry, "messages": [self.to_message(message_dict) for message_dict in message_dicts]}
+
+    def get_local(self, key: Tuple[str, str], version: Version) -> Optional[Dict]:
+        entry = self.local.get(key)
+        if entry is None or entry["version"] != list(version):
+            return None
+        return entry
+
+    async def get(self, key: Tuple[str, str], version: Version) -> Optional[Dict]:
+        """Entry for the given session version, or None on a miss"""
+        entry = self.get_local(key, version)
+        if entry is not None:
+            self.local_hits += 1
+            return entry
+
+        if self.redis is not None:
+            try:
+                with timed("redis", "get_history"):
+                    cached = await self.redis.get(chat_history_key(*key))
+            except RedisError as e:
+                logger.warning(f"History cache lookup failed for session {key[1]}: {str(e)}")
+                cached = None
+            if cached is not None:
+                entry = json.loads(cached)
+                if entry["version"] == list(version) and "unfolded" in entry:
+                    entry = self._with_messages(entry)
+                    self.local.set(key, entry)
+                    self.redis_hits += 1
+                    return entry
+
+        self.misses += 1
+        return None
+
+    def put_local(
+        self,
+        key: Tuple[str, str],
+        version: Version,
+        summary: str,
+        window: List[Dict],
+        unfolded: List[Dict]
+    ) -> Dict:
+        entry = self._with_messages({
+            "version": list(version),
+            "summary": summary,
+            "unfolded": unfolded,
+            "window": window,
+            "unfolded_tokens": sum(self.tokens(message_dict) for message_dict in unfolded)
+        })
+        self.local.set(key, entry)
+        return entry
+
+    async def _share(self, key: Tuple[str, str], entry: Dict):
+        shared = {name: value for name, value in entry.items() if name != "messages"}
+        try:
+            with timed("redis", "set_history"):
+                await self.redis.set(chat_history_key(*key), json.dumps(shared), ex=self.redis_ttl)
+        except RedisError as e:
+            logger.warning(f"Failed to share history of session {key[1]}: {str(e)}")
+
+    async def put(
+        self,
+        key: Tuple[str, str],
+        version: Version,
+        summary: str,
+        window: List[Dict],
+        unfolded: List[Dict]
+    ) -> Dict:
+        """Store a freshly read window on this worker and in Redis"""
+        entry = self.put_local(key, version, summary, window, unfolded)
+        if self.redis is not None:
+            await self._share(key, entry)
+        return entry
+
+    async def extend(
+        self,
+        key: Tuple[str, str],
+        previous_version: Version,
+        version: Version,
+        message_dicts: List[Dict],
+        token_budget: int
+    ) -> Optional[Dict]:
+        """
+        Append messages just written on top of `previous_version`, trimming
+        the window back to the token budget; trimmed messages move to
+        `unfolded`. The entry is taken from this worker or, failing
+        that, from Redis, and the extended entry is stored in both, so the
+        next turn hits on whichever worker serves it. An entry for any other
+        version is dropped, since this worker can no longer tell what it is
+        missing. Returns the extended entry, or None if there was none.
+        """
+        entry = self.local.get(key)
+        if entry is not None and entry["version"] != list(previous_version):
+            self.local.pop(key)
+            entry = None
+        if entry is None and self.redis is not None:
+            try:
+                with timed("redis", "get_history"):
+                    cached = await self.redis.get(chat_history_key(*key))
+            except RedisError as e:
+                logger.warning(f"History cache lookup failed for session {key[1]}: {str(e)}")
+                cached = None
+            if cached is not None:
+                shared = json.loads(cached)
+                if shared["version"] == list(previous_version) and "unfolded" in shared:
+                    entry = self._with_messages(shared)
+        if entry is None:
+            return None
+
+        window = entry["window"] + message_dicts
+        unfolded = list(entry["unfolded"])
+        # Trimming only moves messages from the window to `unfolded`, so the order holds
+        messages = entry["messages"] + [self.to_message(message_dict) for message_dict in message_dicts]
+        used = sum(self.tokens(message_dict) for message_dict in window)
+        unfolded_tokens = entry["unfolded_tokens"]
+        # Keep the newest message even if it alone exceeds the budget
+        while len(window) > 1 and used > token_budget:
+            unfolded.append(window.pop(0))
+            trimmed = self.tokens(unfolded[-1])
+            used -= trimmed
+            unfolded_tokens += trimmed
+        entry = {
+            "version": list(version),
+            "summary": entry["summary"],
+            "unfolded": unfolded,
+            "window": window,
+            "unfolded_tokens": unfolded_tokens,
+            "messages": messages
+        }
+        self.local.set(key, entry)
+        if self.redis is not None:
+            await self._share(key, entry)
+        return entry
+
+    async def invalidate(self, key: Tuple[str, str]):
+        self.local.pop(key)
+        if self.redis is not None:
+            try:
+                await self.redis.delete(chat_history_key(*key))
+            except RedisError as e:
+                logger.warning(f"Failed to drop shared history of session {key[1]}: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.local_hits + self.redis_hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.local_hits + self.redis_hits) / lookups if lookups else 0.0,
+            "local": self.local.stats()
+        }
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import re
+import time
+from typing import Any, Dict, Optional
+
+import firebase_admin
+import jwt
+from cryptography.x509 import load_pem_x509_certificate
+from config.settings import get_settings
+from utils.http_client import get_http_client
+
+# Get application settings
+settings = get_settings()
+
+logger = logging.getLogger(__name__)
+
+
+class UnknownSigningKeyError(Exception):
+    """The token was signed with a key that is not in the current key set"""
+
+
+def parse_max_age(cache_control: Optional[str], default: int) -> int:
+    """Extract `max-age` from a Cache-Control header"""
+    match = re.search(r"max-age=(\d+)", cache_control or "")
+    return int(match.group(1)) if match else default
+
+
+def load_public_keys(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build a `kid -> public key` map from either a JWKS document
+    (`{"keys": [...]}`) or Google's X.509 format (`{kid: PEM certificate}`).
+    """
+    if "keys" in data:
+        return {jwk["kid"]: jwt.PyJWK(jwk).key for jwk in data["keys"]}
+    return {
+        kid: load_pem_x509_certificate(pem.encode("utf-8")).public_key()
+        for kid, pem in data.items()
+    }
+
+
+class SigningKeyManager:
+    """
+    Keeps Google's token signing keys in memory and verifies Firebase ID
+    tokens locally against them.
+
+    Keys are loaded at startup and refreshed in the background shortly before
+    the `Cache-Control` max-age of the last response runs out, so no request
+    ever waits on a certificate fetch. A token signed with an unknown key
+    triggers an early refresh, rate limited to one per `min_refresh_interval`.
+
+    Tokens must be issued for `project_id`; when it is not configured, the
+    project of the initialized Firebase Admin app is used.
+    """
+
+    def __init__(
+        self,
+        keys_url: str,
+        project_id: Optional[str],
+        refresh_margin: float = 300,
+        min_refresh_interval: float = 60,
+        fetch_timeout: float = 10,
+        clock_skew: int = 0
+    ):
+        self.keys_url = keys_url
+        self.project_id = project_id
+        self.issuer: Optional[str] = None
+        self.refresh_margin = refresh_margin
+        self.min_refresh_interval = min_refresh_interval
+        self.fetch_timeout = fetch_timeout
+        self.clock_skew = clock_skew
+
+        self._keys: Dict[str, Any] = {}
+        self._expires_at = 0.0
+        self._last_refresh = 0.0
+        self._refresh_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return bool(self._keys)
+
+    async def start(self):
+        """Load the keys and start the background refresh loop"""
+        # Fail at startup rather than rejecting every token with a bad audience
+        self.project_id = self.project_id or firebase_admin.get_app().project_id
+        if not self.project_id:
+            raise RuntimeError(
+                "Local token verification needs a Firebase project ID; set FIREBASE_PROJECTID "
+                "or AUTH_LOCAL_VERIFICATION=false"
+            )
+        self.issuer = f"https://securetoken.google.com/{self.project_id}"
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.error(f"Failed to load token signing keys: {str(e)}")
+        self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def refresh(self):
+        """Fetch the current key set and schedule its expiry"""
+        async with self._refresh_lock:
+            await self._fetch()
+
+    async def _fetch(self):
+        response = await get_http_client().get(self.keys_url, timeout=self.fetch_timeout)
+        response.raise_for_status()
+        max_age = parse_max_age(response.headers.get("cache-control"), default=3600)
+        self._keys = load_public_keys(response.json())
+        self._last_refresh = time.monotonic()
+        self._expires_at = self._last_refresh + max_age
+        logger.info(f"Loaded {len(self._keys)} token signing keys, valid for {max_age}s")
+
+    def _stale(self) -> bool:
+        return time.monotonic() - self._last_refresh >= self.min_refresh_interval
+
+    async def refresh_if_stale(self):
+        """
+        Refresh early after an unknown key, at most once per interval. The
+        check is repeated under the lock, so a burst of unknown keys waits on
+        one fetch instead of queueing one each.
+        """
+        if not self._stale():
+            return
+        async with self._refresh_lock:
+            if self._stale():
+                await self._fetch()
+
+    async def _refresh_loop(self):
+        while True:
+            delay = self._expires_at - self.refresh_margin - time.monotonic()
+            await asyncio.sleep(max(delay, self.min_refresh_interval))
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"Token signing key refresh failed, keeping current keys: {str(e)}")
+
+    def verify(self, token: str) -> Dict[str, Any]:
+        """
+        Verify a Firebase ID token against the in-memory keys and return its
+        claims, with `uid` set as the Admin SDK does. CPU-bound; run it off the
+        event loop for throughput.
+        """
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = self._keys.get(kid)
+        if key is None:
+            raise UnknownSigningKeyError(f"No signing key with kid {kid!r}")
+
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=["RS256"],
+            audience=self.project_id,
+            issuer=self.issuer,
+            leeway=self.clock_skew,
+            options={"require": ["exp", "iat", "aud", "iss", "sub"]}
+        )
+        subject = claims["sub"]
+        if not isinstance(subject, str) or not subject or len(subject) > 128:
+            raise jwt.InvalidTokenError("Token has an invalid subject claim")
+        if claims.get("auth_time", 0) > time.time() + self.clock_skew:
+            raise jwt.InvalidTokenError("Token has an auth_time in the future")
+
+        claims["uid"] = subject
+        return claims
+
+
+key_manager = SigningKeyManager(
+    keys_url=settings.auth.signing_keys_url,
+    project_id=settings.firebase.projectid or None,
+    refresh_margin=settings.auth.signing_keys_refresh_margin,
+    min_refresh_interval=settings.auth.signing_keys_min_refresh_interval,
+    fetch_timeout=settings.auth.signing_keys_fetch_timeout,
+    clock_skew=settings.auth.clock_skew
+)
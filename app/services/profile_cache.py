@@ -0,0 +1,178 @@
+import asyncio
+import json
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+
+from fastapi.encoders import jsonable_encoder
+from redis.exceptions import ConnectionError, RedisError
+from config.settings import get_settings
+from utils.cache_keys import user_profile_generation_key, user_profile_key
+from utils.lru import LRUCache
+from utils.metrics import timed
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+
+# Store the profile only if no invalidation bumped the generation since it was read
+SET_IF_GENERATION = """
+if (redis.call('GET', KEYS[2]) or '0') == ARGV[2] then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+    return 1
+end
+return 0
+"""
+
+
+class ProfileCache:
+    """
+    Read-through cache of user profiles: a short-lived per-worker LRU in
+    front of a shared Redis copy in front of Firestore.
+
+    Profiles are cached in their JSON form, so hits and misses return the
+    same types. `invalidate` drops both tiers, bumps the user's generation
+    counter and publishes the user ID on a Redis channel; every worker
+    listens on it and drops its own copy, so an update is visible everywhere
+    on the next read. A profile loaded before an invalidation is not cached
+    by either tier, since the generation (or, locally, the invalidation
+    count) changed while it was being read. Redis errors are logged and fall
+    through to Firestore, and the local TTL bounds staleness if an
+    invalidation message is missed.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        redis_ttl: int,
+        channel: str,
+        resubscribe_delay: float,
+        poll_interval: float = 1.0
+    ):
+        self.local = LRUCache(maxsize=maxsize, ttl=ttl, name="profiles")
+        self.redis_ttl = redis_ttl
+        self.channel = channel
+        self.resubscribe_delay = resubscribe_delay
+        self.poll_interval = poll_interval
+        self.redis = None
+        self._set_if_generation = None
+        # Invalidations seen by this worker, to spot local fills that raced one
+        self._invalidations = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, redis):
+        """Use `redis` for the shared tier and start listening for invalidations"""
+        self.redis = redis
+        self._set_if_generation = redis.register_script(SET_IF_GENERATION)
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.redis = None
+
+    def _drop_local(self, user_id: str):
+        self._invalidations += 1
+        self.local.pop(user_id)
+
+    async def get(self, user_id: str, load: Callable[[str], Awaitable[Optional[Dict]]]) -> Optional[Dict]:
+        """Cached profile of a user, loaded with `load` on a miss; missing profiles are not cached"""
+        profile = self.local.get(user_id)
+        if profile is not None:
+            return profile
+
+        invalidations = self._invalidations
+        generation = None
+        if self.redis is not None:
+            try:
+                with timed("redis", "get_profile"):
+                    cached, generation = await self.redis.mget(
+                        user_profile_key(user_id), user_profile_generation_key(user_id)
+                    )
+            except RedisError as e:
+                logger.warning(f"Profile cache lookup failed for user {user_id}: {str(e)}")
+                cached = None
+            if cached is not None:
+                profile = json.loads(cached)
+                if self._invalidations == invalidations:
+                    self.local.set(user_id, profile)
+                return profile
+
+        profile = await load(user_id)
+        if profile is None:
+            return None
+        profile = jsonable_encoder(profile)
+
+        if self.redis is not None:
+            if isinstance(generation, bytes):
+                generation = generation.decode("utf-8")
+            try:
+                stored = await self._set_if_generation(
+                    keys=[user_profile_key(user_id), user_profile_generation_key(user_id)],
+                    args=[json.dumps(profile), generation or "0", self.redis_ttl]
+                )
+            except RedisError as e:
+                logger.warning(f"Failed to share profile of user {user_id}: {str(e)}")
+                stored = 1
+            if not stored:
+                # Invalidated while it was loading; the next read loads it again
+                return profile
+        if self._invalidations == invalidations:
+            self.local.set(user_id, profile)
+        return profile
+
+    async def invalidate(self, user_id: str):
+        """Drop a user's profile here, in Redis and on every other worker"""
+        self._drop_local(user_id)
+        if self.redis is None:
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.incr(user_profile_generation_key(user_id))
+                # Only fills that started within this window can race the bump
+                pipe.expire(user_profile_generation_key(user_id), self.redis_ttl)
+                pipe.delete(user_profile_key(user_id))
+                pipe.publish(self.channel, user_id)
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Failed to invalidate profile of user {user_id}: {str(e)}")
+
+    async def _listen(self):
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                # Anything cached while unsubscribed may have missed an invalidation
+                self.local.clear()
+                self._invalidations += 1
+                while True:
+                    # Poll with an explicit timeout; a blocking read would hit the
+                    # pool's socket timeout whenever the channel is quiet
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=self.poll_interval)
+                    if message is None:
+                        continue
+                    user_id = message["data"]
+                    if isinstance(user_id, bytes):
+                        user_id = user_id.decode("utf-8")
+                    self._drop_local(user_id)
+            except ConnectionError as e:
+                logger.warning(f"Profile invalidation subscription lost, resubscribing: {str(e)}")
+                await asyncio.sleep(self.resubscribe_delay)
+            except RedisError as e:
+                logger.warning(f"Profile invalidation listener failed, resubscribing: {str(e)}")
+                await asyncio.sleep(self.resubscribe_delay)
+            finally:
+                await pubsub.aclose()
+
+
+profile_cache = ProfileCache(
+    maxsize=settings.auth.profile_cache_size,
+    ttl=settings.auth.profile_cache_ttl,
+    redis_ttl=settings.auth.profile_cache_redis_ttl,
+    channel=settings.auth.profile_invalidation_channel,
+    resubscribe_delay=settings.auth.profile_resubscribe_delay
+)
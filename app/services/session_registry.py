@@ -0,0 +1,64 @@
+import logging
+from typing import Dict, Optional
+
+from redis.exceptions import RedisError
+from config.settings import get_settings
+from utils.cache_keys import chat_session_key
+from utils.metrics import timed_async
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+
+class SessionRegistry:
+    """
+    Index of chat sessions in Redis, shared by every worker.
+
+    Each session is a hash under `chat_session:{uid}:{session_id}` holding its
+    owner and metadata, so an existence check is a single EXISTS. Entries
+    expire after `ttl` seconds without use. Firestore stays the source of
+    truth: a miss means "unknown", not "missing", and Redis errors are logged
+    and treated as misses.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+
+    @timed_async("redis", "register_session")
+    async def register(self, redis, user_id: str, session_id: str, metadata: Optional[Dict[str, str]] = None):
+        """Record a session that is known to exist"""
+        key = chat_session_key(user_id, session_id)
+        try:
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.hset(key, mapping={"owner": user_id, **(metadata or {})})
+                pipe.expire(key, self.ttl)
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Failed to register session {session_id}: {str(e)}")
+
+    @timed_async("redis", "session_exists")
+    async def exists(self, redis, user_id: str, session_id: str) -> bool:
+        """True if the session is registered; refreshes its expiry on a hit"""
+        key = chat_session_key(user_id, session_id)
+        try:
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.exists(key)
+                pipe.expire(key, self.ttl)
+                found, _ = await pipe.execute()
+            return bool(found)
+        except RedisError as e:
+            logger.warning(f"Session registry lookup failed for {session_id}: {str(e)}")
+            return False
+
+    @timed_async("redis", "remove_session")
+    async def remove(self, redis, user_id: str, session_id: str):
+        """Drop a deleted session from the registry"""
+        try:
+            await redis.delete(chat_session_key(user_id, session_id))
+        except RedisError as e:
+            logger.warning(f"Failed to remove session {session_id} from the registry: {str(e)}")
+
+
+session_registry = SessionRegistry(ttl=settings.chat.session_registry_ttl)
@@ -1,149 +1,415 @@
-from utils.llm import LLM
+from utils.llm import model_registry
+from config.settings import get_settings
+from utils.cache_keys import (
+    content_digest,
+    chunk_params_digest,
+    summary_params_digest,
+    summary_cache_key,
+    chunk_cache_key,
+    summary_access_key
+)
 from models.summarizer_model import Summarizermodel
-from fastapi import Request, File, UploadFile
+from utils.sse import format_sse
+from utils.scheduler import AdaptiveScheduler
+from utils.pdf import count_pdf_pages, iter_pdf_pages
+from utils.uploads import SpooledUpload, spool_upload
+from utils.metrics import timed, timed_async
+from utils.usage import usage_config
+from fastapi import Request, File, UploadFile, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List, Optional, Tuple
 
 
-from langchain.chains.summarize import load_summarize_chain
+from langchain.chains.summarize import map_reduce_prompt
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.docstore.document import Document
+from langchain_core.output_parsers import StrOutputParser
+from redis.exceptions import RedisError
 
 import tempfile
 import os
 import io
-from PyPDF2 import PdfReader  
+import time
+import logging
 
 
+# Setup logging
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+# Summaries depend on these settings, so they are folded into every cache key
+params_digest = summary_params_digest(settings.llm, settings.summarizer)
+map_params_digest = chunk_params_digest(settings.llm, settings.summarizer)
+
+# Same prompt that load_summarize_chain's map_reduce uses for map and combine
+SUMMARY_PROMPT = map_reduce_prompt.PROMPT
+
+# Shared by every request so that concurrent documents adapt to one budget
+map_scheduler = AdaptiveScheduler(
+    max_concurrency=settings.summarizer.map_max_concurrency,
+    min_concurrency=settings.summarizer.map_min_concurrency,
+    max_retries=settings.summarizer.map_max_retries,
+    backoff_base=settings.summarizer.map_backoff_base,
+    backoff_max=settings.summarizer.map_backoff_max,
+    latency_spike_factor=settings.summarizer.map_latency_spike_factor
+)
+
+
+@timed_async("redis")
+async def get_cached_summary(redis, cache_key: str, user_id: str):
+    """
+    Look up a cached summary, refresh its expiry and record the user's access
+    in a single pipelined round-trip. Summaries are stored once per content
+    digest and shared between users; access is tracked per user. A Redis
+    error is logged and treated as a miss.
+    """
+    access_key = summary_access_key(user_id)
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.get(cache_key)
+            pipe.expire(cache_key, settings.redis.cache_ttl)
+            pipe.zadd(access_key, {cache_key: time.time()})
+            pipe.expire(access_key, settings.redis.cache_ttl)
+            cached_summary, *_ = await pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Summary cache lookup failed: {str(e)}")
+        return None
+
+    if isinstance(cached_summary, bytes):
+        cached_summary = cached_summary.decode('utf-8')
+    return cached_summary
+
+
+@timed_async("redis")
+async def set_cached_summary(redis, cache_key: str, summary: str):
+    """Store a summary with the configured expiry; a Redis error is only logged"""
+    try:
+        await redis.set(cache_key, summary, ex=settings.redis.cache_ttl)
+    except RedisError as e:
+        logger.warning(f"Failed to cache summary: {str(e)}")
+
+
+async def iterate_documents(docs: List[Document]) -> AsyncIterator[Document]:
+    """Adapt an in-memory list of documents to the streaming pipeline"""
+    for doc in docs:
+        yield doc
+
+
+async def split_documents(docs: AsyncIterable[Document]) -> List[Document]:
+    """
+    Split documents into the chunks that are summarized in the map step.
+    Documents are split as they arrive, so PDF pages go straight from the
+    extraction workers into the splitter without being concatenated first.
+    """
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=settings.summarizer.chunk_size,
+        chunk_overlap=settings.summarizer.chunk_overlap
+    )
+    split_docs = []
+    async for doc in docs:
+        split_docs.extend(text_splitter.split_documents([doc]))
+    return split_docs
+
+
+@timed_async("redis")
+async def lookup_chunks(split_docs: List[Document], redis) -> Tuple[List[str], List[Optional[str]]]:
+    """
+    Fetch cached map outputs for every chunk in a single MGET; on a Redis
+    error every chunk is a miss
+    """
+    chunk_keys = [
+        chunk_cache_key(map_params_digest, content_digest(doc.page_content))
+        for doc in split_docs
+    ]
+    try:
+        cached = await redis.mget(chunk_keys) if chunk_keys else []
+    except RedisError as e:
+        logger.warning(f"Chunk summary lookup failed: {str(e)}")
+        cached = [None] * len(chunk_keys)
+    summaries = [
+        value.decode('utf-8') if isinstance(value, bytes) else value
+        for value in cached
+    ]
+    return chunk_keys, summaries
+
+
+async def reduce_summaries(summaries: List[str], model, config: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+    """
+    Combine map summaries into one, collapsing them in groups first while
+    they exceed the reduce token budget. The final combine step is streamed.
+    """
+    combine_chain = SUMMARY_PROMPT | model | StrOutputParser()
+    token_max = settings.summarizer.reduce_token_max
+
+    while len(summaries) > 1 and sum(model.get_num_tokens(s) for s in summaries) > token_max:
+        groups, group, group_tokens = [], [], 0
+        for summary in summaries:
+            tokens = model.get_num_tokens(summary)
+            if group and group_tokens + tokens > token_max:
+                groups.append(group)
+                group, group_tokens = [], 0
+            group.append(summary)
+            group_tokens += tokens
+        groups.append(group)
+
+        if len(groups) == len(summaries):
+            # Every summary is already over budget on its own; stop collapsing
+            break
+        summaries = await combine_chain.abatch(
+            [{"text": "\n\n".join(group)} for group in groups],
+            config=config
+        )
+
+    async for token in combine_chain.astream({"text": "\n\n".join(summaries)}, config=config):
+        yield token
+
+
+async def summary_events(
+    docs: AsyncIterable[Document],
+    cache_key: str,
+    redis,
+    user_id: str,
+    route: str
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Run the map_reduce summarization as a stream of `(event, data)` pairs.
+    
+    A `progress` event is emitted once cached chunks are known and again as
+    each remaining chunk's map summary completes, followed by `token` events
+    for the reduce step and a final `done` event carrying the summary. Map
+    outputs are cached by chunk digest as they complete, so an edited or
+    interrupted document only pays for chunks that were not summarized yet.
+    Map calls go through the shared adaptive scheduler and their results are
+    put back in chunk order before the reduce step. LLM usage is attributed to
+    `user_id` under `{route}:map` and `{route}:reduce`.
+    """
+    model = model_registry.get_model()
+    split_docs = await split_documents(docs)
+    chunk_keys, summaries = await lookup_chunks(split_docs, redis)
+    missing = [index for index, value in enumerate(summaries) if value is None]
+    stats = {
+        "chunk_hits": len(split_docs) - len(missing),
+        "chunk_misses": len(missing)
+    }
+    total = len(split_docs)
+    completed = stats["chunk_hits"]
+    yield "progress", {"stage": "map", "completed": completed, "total": total, **stats}
+
+    # Retries are left to the scheduler so it sees every 429 and can back off
+    map_model = model_registry.get_model(max_retries=0)
+    map_chain = SUMMARY_PROMPT | map_model | StrOutputParser()
+
+    async def map_chunk(index: int):
+        output = await map_chain.ainvoke(
+            {"text": split_docs[index].page_content},
+            config=usage_config(user_id, f"{route}:map")
+        )
+        # Caching is best-effort; a Redis error must not discard the LLM output
+        try:
+            with timed("redis", "set_chunk_summary"):
+                await redis.set(chunk_keys[index], output, ex=settings.redis.cache_ttl)
+        except RedisError as e:
+            logger.warning(f"Failed to cache chunk summary: {str(e)}")
+        return output
+
+    async for position, output in map_scheduler.map(map_chunk, missing):
+        summaries[missing[position]] = output
+        completed += 1
+        yield "progress", {"stage": "map", "completed": completed, "total": total, **stats}
+
+    yield "progress", {"stage": "reduce", "completed": completed, "total": total, **stats}
+    tokens = []
+    async for token in reduce_summaries(summaries, model, usage_config(user_id, f"{route}:reduce")):
+        tokens.append(token)
+        yield "token", {"content": token}
+    summary = "".join(tokens)
+
+    await set_cached_summary(redis, cache_key, summary)
+    yield "done", {"message": summary, "cache": {"summary_hit": False, **stats}}
+
+
+async def summarize_documents(docs: AsyncIterable[Document], cache_key: str, redis, user_id: str, route: str) -> Tuple[str, Dict[str, Any]]:
+    """Run the summarization to completion and return the summary and cache stats"""
+    async for event, data in summary_events(docs, cache_key, redis, user_id, route):
+        if event == "done":
+            return data["message"], data["cache"]
+
+
+async def cached_summary_events(cached_summary: str) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """Event stream for a request answered entirely from the summary cache"""
+    yield "done", {
+        "message": cached_summary,
+        "cache": {"summary_hit": True, "chunk_hits": 0, "chunk_misses": 0}
+    }
+
+
+async def to_sse(events: AsyncIterator[Tuple[str, Dict[str, Any]]]) -> AsyncIterator[str]:
+    """Encode summary events as SSE, reporting failures as an `error` event"""
+    try:
+        async for event, data in events:
+            yield format_sse(data, event=event)
+    except Exception as e:
+        yield format_sse({"status": "error", "message": str(e)}, event="error")
+
+
+async def pdf_documents(path: str, page_count: int) -> AsyncIterator[Document]:
+    """Yield one document per PDF page as the extraction workers finish"""
+    async for page, text in iter_pdf_pages(path, page_count):
+        if text:
+            yield Document(page_content=text, metadata={"page": page})
+
+
+async def load_file_documents(upload: SpooledUpload) -> Optional[AsyncIterable[Document]]:
+    """
+    Prepare the document stream for an uploaded file, or return None if the
+    type is unsupported. PDFs over the page cap are rejected up front.
+    Everything the stream needs is read or copied here, since the request's
+    form is closed before a streamed response finishes.
+    """
+    if upload.content_type == "application/pdf":
+        # The extraction workers run in other processes and need a named file
+        path = await run_in_threadpool(upload.materialize)
+        page_count = await count_pdf_pages(path)
+        if page_count > settings.summarizer.pdf_max_pages:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"PDF has {page_count} pages; the limit is {settings.summarizer.pdf_max_pages}."
+            )
+        return pdf_documents(path, page_count)
+    elif upload.content_type == "text/plain":
+        text = await run_in_threadpool(upload.read_text)
+        return iterate_documents([Document(page_content=text)])
+    return None
+
+
+async def closing_upload(events: AsyncIterator[Tuple[str, Dict[str, Any]]], upload: SpooledUpload):
+    """Pass events through, removing the upload's named copy once the stream ends"""
+    try:
+        async for event in events:
+            yield event
+    finally:
+        upload.close()
+
 
 async def summarize_text(user_input: Summarizermodel, request: Request):
     try:
         # Generate cache key
         u_id = request.state.user["uid"]
-        cache_key = f"summary:{u_id}:{hash(user_input.text)}"
-        cached_summary = request.app.state.redis.get(cache_key)
+        cache_key = summary_cache_key(params_digest, content_digest(user_input.text))
+        cached_summary = await get_cached_summary(request.app.state.redis, cache_key, u_id)
         if not cached_summary:
-            llm = LLM()
-            model = llm.get_openai_model()
              # Create document from input text
-            docs = [Document(page_content=user_input.text)]
-            
-            # Split text into manageable chunks
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=100
-            )
-            split_docs = text_splitter.split_documents(docs)
-            
-            # Use map_reduce for batch processing
-            chain = load_summarize_chain(
-                llm=model, 
-                chain_type="map_reduce",  # Changed from "stuff" to "map_reduce"
-                verbose=False
-            )
-            
-            # Process in batches
-            summary = await chain.arun(split_docs)
-            
-            # set value to redis
-            request.app.state.redis.set(cache_key, summary, ex=3600)
-        
-       
-        
-           
+            docs = iterate_documents([Document(page_content=user_input.text)])
+
+            summary, stats = await summarize_documents(docs, cache_key, request.app.state.redis, u_id, "summarize_text")
+
             result = {
                 "status": "success",
-                "message": summary
-                
+                "message": summary,
+                "cache": stats
             }
             return result
-        if isinstance(cached_summary, bytes):
-            cached_summary = cached_summary.decode('utf-8')
-        
+
         result = {
             "status": "success",
-            "message": summary,
-            "message": cached_summary
-           
+            "message": cached_summary,
+            "cache": {"summary_hit": True, "chunk_hits": 0, "chunk_misses": 0}
         }
-        
+        return result
+
     except Exception as e:
         result = {
             "status": "error",
             "message": str(e)
         }
         return result
-        
-    
+
+
 async def summarize_file(request: Request, file: UploadFile = File(...)):
+    upload = None
     try:
-        llm = LLM()
-        model = llm.get_openai_model()
-        
-        content_type = file.content_type
-        file_content = await file.read()
-        cache_key = f"file_summary:{request.state.user['uid']}:{hash(file_content)}"
-        cached_summary = request.app.state.redis.get(cache_key)
-        
-        if not cached_summary:
+        # The digest is computed first, so the cache is checked before
+        # anything is parsed
+        upload = await spool_upload(file)
+        cache_key = summary_cache_key(params_digest, upload.digest)
+        cached_summary = await get_cached_summary(request.app.state.redis, cache_key, request.state.user["uid"])
 
-            if content_type == "application/pdf":
-                pdf_reader = PdfReader(io.BytesIO(file_content))
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text()
-                
-                # Create document from extracted text
-                docs = [Document(page_content=text)]
-            elif content_type == "text/plain":
-                text = file_content.decode("utf-8")
-                docs = [Document(page_content=text)]
-            else:
+        if not cached_summary:
+            docs = await load_file_documents(upload)
+            if docs is None:
                 result = {
                     "status": "error",
                     "message": "Unsupported file format. Please upload a PDF or TXT file."
                 }
                 return result
-            
-            # Split text into manageable chunks
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=100
-            )
-            split_docs = text_splitter.split_documents(docs)
-            # Use map_reduce for batch processing
-            chain = load_summarize_chain(
-                llm=model,
-                chain_type="map_reduce",  # Changed from "stuff" to "map_reduce"
-                verbose=False
+
+            summary, stats = await summarize_documents(
+                docs, cache_key, request.app.state.redis, request.state.user["uid"], "summarize_file"
             )
-            
-            # Process in batches
-            summary = await chain.arun(split_docs)
-            
-            # set value to redis
-            request.app.state.redis.set(cache_key, summary, ex=3600)
 
-        
             result = {
                 "status": "success",
-                "message": "summary"
+                "message": summary,
+                "cache": stats
             }
             return result
-        if isinstance(cached_summary, bytes):
-            cached_summary = cached_summary.decode('utf-8')
-        
-       
-       
+
         return {
             "status": "success",
-            "message": cached_summary
+            "message": cached_summary,
+            "cache": {"summary_hit": True, "chunk_hits": 0, "chunk_misses": 0}
         }
-        
-       
-        
+
+    except HTTPException:
+        raise
     except Exception as e:
         result = {
             "status": "error",
             "message": str(e)
         }
         return result
-        
\ No newline at end of file
+    finally:
+        if upload is not None:
+            upload.close()
+
+
+async def stream_summarize_text(user_input: Summarizermodel, request: Request):
+    """Summarize text as a stream of SSE progress, token and done events"""
+    u_id = request.state.user["uid"]
+    cache_key = summary_cache_key(params_digest, content_digest(user_input.text))
+    cached_summary = await get_cached_summary(request.app.state.redis, cache_key, u_id)
+    if cached_summary:
+        return to_sse(cached_summary_events(cached_summary))
+    
+    docs = iterate_documents([Document(page_content=user_input.text)])
+    return to_sse(summary_events(docs, cache_key, request.app.state.redis, u_id, "summarize_text_stream"))
+
+
+async def stream_summarize_file(request: Request, file: UploadFile = File(...)):
+    """
+    Summarize an uploaded file as a stream of SSE progress, token and done
+    events. Oversized uploads and unsupported formats are rejected before the
+    stream starts.
+    """
+    upload = await spool_upload(file)
+    try:
+        cache_key = summary_cache_key(params_digest, upload.digest)
+        cached_summary = await get_cached_summary(request.app.state.redis, cache_key, request.state.user["uid"])
+        if cached_summary:
+            upload.close()
+            return to_sse(cached_summary_events(cached_summary))
+        
+        docs = await load_file_documents(upload)
+        if docs is None:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="Unsupported file format. Please upload a PDF or TXT file."
+            )
+    except BaseException:
+        upload.close()
+        raise
+    events = summary_events(
+        docs, cache_key, request.app.state.redis, request.state.user["uid"], "summarize_file_stream"
+    )
+    return to_sse(closing_upload(events, upload))
@@ -0,0 +1,76 @@
+import asyncio
+import hashlib
+import time
+from typing import Dict
+
+from firebase_admin import auth
+from fastapi.concurrency import run_in_threadpool
+from config.settings import get_settings
+from utils.lru import LRUCache
+from services.key_manager import key_manager, UnknownSigningKeyError
+
+# Get application settings
+settings = get_settings()
+
+
+def user_from_claims(decoded_token: Dict) -> Dict:
+    """Build the request user from decoded Firebase ID token claims"""
+    return {
+        "uid": decoded_token["uid"],
+        "email": decoded_token.get("email", ""),
+        "role": decoded_token.get("role", "user")
+    }
+
+
+class TokenVerifier:
+    """
+    Verifies Firebase ID tokens, caching the resulting user until the token's
+    `exp`. Cache keys are token digests so raw tokens are never held in
+    memory as keys. Misses are checked against the key manager's in-memory
+    signing keys in the thread pool, and concurrent misses for the same
+    token share one verification.
+    """
+
+    def __init__(self, maxsize: int, max_ttl: float):
+        self.cache = LRUCache(maxsize=maxsize, name="tokens")
+        self.max_ttl = max_ttl
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def _decode(self, token: str) -> Dict:
+        if not (settings.auth.local_verification and key_manager.ready):
+            # Fall back to the Admin SDK, which fetches certificates itself
+            return await run_in_threadpool(auth.verify_id_token, token)
+        try:
+            return await run_in_threadpool(key_manager.verify, token)
+        except UnknownSigningKeyError:
+            # Keys may have rotated since the last refresh
+            await key_manager.refresh_if_stale()
+            return await run_in_threadpool(key_manager.verify, token)
+
+    async def _verify(self, key: str, token: str) -> Dict:
+        decoded_token = await self._decode(token)
+        user = user_from_claims(decoded_token)
+        ttl = min(decoded_token["exp"] - time.time(), self.max_ttl)
+        if ttl > 0:
+            self.cache.set(key, user, ttl=ttl)
+        return user
+
+    async def verify(self, token: str) -> Dict:
+        """Return the user for a valid token, or raise if verification fails"""
+        key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+        user = self.cache.get(key)
+        if user is not None:
+            return user
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._verify(key, token))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+
+token_verifier = TokenVerifier(
+    maxsize=settings.auth.token_cache_size,
+    max_ttl=settings.auth.token_cache_max_ttl
+)
@@ -0,0 +1,78 @@
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException, status
+from redis.exceptions import RedisError
+from config.settings import get_settings
+from utils.cache_keys import llm_usage_key
+from utils.metrics import timed
+from utils.usage import USAGE_FIELDS
+
+# Setup logging
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+
+def usage_row(day: str, model: str, route: str, counters: Dict[str, float]) -> Dict[str, Any]:
+    """One usage row with the derived averages"""
+    requests = counters.get("requests", 0)
+    ttft_count = counters.get("ttft_count", 0)
+    return {
+        "day": day,
+        "model": model,
+        "route": route,
+        "requests": int(requests),
+        "errors": int(counters.get("errors", 0)),
+        "prompt_tokens": int(counters.get("prompt_tokens", 0)),
+        "completion_tokens": int(counters.get("completion_tokens", 0)),
+        "cost": round(counters.get("cost", 0.0), 6),
+        "avg_latency": counters.get("latency_sum", 0.0) / requests if requests else None,
+        "avg_ttft": counters.get("ttft_sum", 0.0) / ttft_count if ttft_count else None
+    }
+
+
+async def get_user_usage(user_id: str, redis, days: Optional[int] = None) -> Dict[str, Any]:
+    """
+    LLM usage of a user over the last `days` days (today included), one row
+    per day, model and route, plus totals. Usage still aggregated on the
+    workers and not yet flushed is not included.
+    """
+    days = max(1, min(days or 7, settings.usage.max_query_days))
+    today = datetime.now(timezone.utc).date()
+    day_keys = [(today - timedelta(days=offset)).strftime("%Y-%m-%d") for offset in range(days)]
+
+    try:
+        with timed("redis", "get_usage"):
+            async with redis.pipeline(transaction=False) as pipe:
+                for day in day_keys:
+                    pipe.hgetall(llm_usage_key(user_id, day))
+                results = await pipe.execute()
+    except RedisError as e:
+        logger.error(f"Failed to read LLM usage of user {user_id}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Usage data is temporarily unavailable"
+        )
+
+    rows = []
+    totals = defaultdict(float)
+    for day, fields in zip(day_keys, results):
+        grouped: Dict[tuple, Dict[str, float]] = defaultdict(dict)
+        for field, value in fields.items():
+            if isinstance(field, bytes):
+                field = field.decode("utf-8")
+            # Model names may contain "|", so split the route and metric off the right
+            model, route, metric = field.rsplit("|", 2)
+            if metric not in USAGE_FIELDS:
+                continue
+            grouped[(model, route)][metric] = float(value)
+            totals[metric] += float(value)
+        rows.extend(usage_row(day, model, route, counters) for (model, route), counters in sorted(grouped.items()))
+
+    summary = usage_row(None, None, None, totals)
+    for name in ("day", "model", "route"):
+        summary.pop(name)
+    return {"user_id": user_id, "days": days, "usage": rows, "totals": summary}
@@ -0,0 +1,89 @@
+import hashlib
+import json
+import unicodedata
+from typing import Any, Dict, Union
+from config.settings import LLMSettings, SummarizerSettings
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize text before hashing so that inputs which only differ in
+    Unicode composition, line endings or surrounding whitespace share a key.
+    """
+    text = unicodedata.normalize("NFC", text)
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text.strip()
+
+
+def content_digest(content: Union[str, bytes]) -> str:
+    """Stable SHA-256 digest of text or raw bytes (unlike the per-process `hash()`)"""
+    if isinstance(content, str):
+        content = normalize_text(content).encode("utf-8")
+    return hashlib.sha256(content).hexdigest()
+
+
+def _params_digest(params: Dict[str, Any]) -> str:
+    encoded = json.dumps(params, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+def chunk_params_digest(llm_settings: LLMSettings, summarizer_settings: SummarizerSettings) -> str:
+    """Digest of the settings that change the map summary of a single chunk"""
+    return _params_digest({
+        "model": llm_settings.model,
+        "temperature": llm_settings.temperature,
+        "version": summarizer_settings.cache_version,
+    })
+
+
+def summary_params_digest(llm_settings: LLMSettings, summarizer_settings: SummarizerSettings) -> str:
+    """Digest of every setting that changes what a full summary looks like"""
+    return _params_digest({
+        "model": llm_settings.model,
+        "temperature": llm_settings.temperature,
+        "chain_type": "map_reduce",
+        "chunk_size": summarizer_settings.chunk_size,
+        "chunk_overlap": summarizer_settings.chunk_overlap,
+        "reduce_token_max": summarizer_settings.reduce_token_max,
+        "version": summarizer_settings.cache_version,
+    })
+
+
+def summary_cache_key(params_digest: str, digest: str) -> str:
+    """Shared, user-independent key under which a summary is stored"""
+    return f"summary:{params_digest}:{digest}"
+
+
+def chunk_cache_key(params_digest: str, digest: str) -> str:
+    """Key under which the map summary of a single chunk is stored"""
+    return f"summary_chunk:{params_digest}:{digest}"
+
+
+def summary_access_key(user_id: str) -> str:
+    """Per-user sorted set recording which summaries the user has requested"""
+    return f"summary_access:{user_id}"
+
+
+def chat_session_key(user_id: str, session_id: str) -> str:
+    """Registry hash holding a chat session's owner and metadata"""
+    return f"chat_session:{user_id}:{session_id}"
+
+
+def chat_history_key(user_id: str, session_id: str) -> str:
+    """Shared copy of a chat session's cached history window"""
+    return f"chat_history:{user_id}:{session_id}"
+
+
+def user_profile_key(user_id: str) -> str:
+    """Shared copy of a user's cached profile"""
+    return f"profile:{user_id}"
+
+
+def user_profile_generation_key(user_id: str) -> str:
+    """Counter bumped by every invalidation of a user's profile"""
+    return f"profile_gen:{user_id}"
+
+
+def llm_usage_key(user_id: str, day: str) -> str:
+    """Per-user, per-day hash of LLM usage counters, keyed by `model|route|metric`"""
+    return f"llm_usage:{user_id}:{day}"
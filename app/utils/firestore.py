@@ -0,0 +1,19 @@
+from typing import Optional
+
+from firebase_admin import firestore_async
+from google.cloud.firestore import AsyncClient
+
+_client: Optional[AsyncClient] = None
+
+
+def get_firestore_client() -> AsyncClient:
+    """
+    Process-wide async Firestore client of the default Firebase app, created
+    on first use so that its channel belongs to the running event loop.
+    Set FIRESTORE_EMULATOR_HOST to point it at the local emulator.
+    """
+    global _client
+    if _client is None:
+        _client = firestore_async.client()
+    return _client
+
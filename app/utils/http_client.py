@@ -0,0 +1,74 @@
+import asyncio
+import importlib.util
+import logging
+import random
+from typing import Any, Optional
+
+import httpx
+from config.settings import get_settings
+
+settings = get_settings()
+
+logger = logging.getLogger(__name__)
+
+# Status codes worth resending. Gateway errors (502, 504) do not prove the
+# upstream did nothing, so only requests safe to repeat resend on them
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+NOT_PROCESSED_STATUS_CODES = {429, 503}
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Process-wide async HTTP client with keep-alive pooling, created on first
+    use. HTTP/2 is negotiated when the optional `h2` package is installed.
+    """
+    global _client
+    if _client is None:
+        http2 = settings.http.http2 and importlib.util.find_spec("h2") is not None
+        _client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=settings.http.max_connections,
+                max_keepalive_connections=settings.http.max_keepalive_connections,
+                keepalive_expiry=settings.http.keepalive_expiry
+            ),
+            timeout=httpx.Timeout(settings.http.timeout, connect=settings.http.connect_timeout)
+        )
+    return _client
+
+
+async def close_http_client():
+    """Close the shared client; called on application shutdown"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def request_with_retries(method: str, url: str, idempotent: bool = True, **kwargs: Any) -> httpx.Response:
+    """
+    Send a request on the shared client, retrying connection failures and
+    retryable statuses with jittered exponential backoff. Pass
+    `idempotent=False` for requests that must not be applied twice; they are
+    only resent when the request was never processed (429, 503 or no
+    connection). Other errors are returned or raised immediately.
+    """
+    client = get_http_client()
+    retry_statuses = RETRY_STATUS_CODES if idempotent else NOT_PROCESSED_STATUS_CODES
+    attempt = 0
+    while True:
+        try:
+            response = await client.request(method, url, **kwargs)
+            if response.status_code not in retry_statuses or attempt >= settings.http.retries:
+                return response
+            reason = f"status {response.status_code}"
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+            if attempt >= settings.http.retries:
+                raise
+            reason = str(e) or type(e).__name__
+        delay = random.uniform(0, settings.http.backoff_base * (2 ** attempt))
+        attempt += 1
+        logger.info(f"Retrying {method} {url.split('?')[0]} in {delay:.2f}s ({reason})")
+        await asyncio.sleep(delay)
@@ -1,23 +1,147 @@
+import asyncio
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import httpx
 from langchain_openai import ChatOpenAI
-from config.settings import get_settings
-  
+from config.settings import get_settings, LLMSettings
+from utils.metrics import STAGE_LATENCY
+from utils.usage import usage_handler
+
 
 
 
 settings = get_settings()
 
-class LLM:
-    def __init__(self):
-        self.model = settings.llm.model
-        self.endpoint = settings.llm.endpoint
-        self.token = settings.llm.token
-        print(self.token) 
-        self.openai_model = ChatOpenAI(
-            api_key=self.token, 
-            model=self.model, 
-            base_url=self.endpoint, 
-            temperature=settings.llm.temperature
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """
+    Response stream that gives back its in-flight slot once it is closed and
+    records the request's total duration, streamed body included.
+    """
+
+    def __init__(self, stream: httpx.AsyncByteStream, release, started: float):
+        self._stream = stream
+        self._release = release
+        self._started = started
+        self._released = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._released:
+                self._released = True
+                self._release()
+                STAGE_LATENCY.labels("llm", "request").observe(time.perf_counter() - self._started)
+
+
+class LimitedAsyncTransport(httpx.AsyncBaseTransport):
+    """
+    Transport that caps the number of requests in flight to the LLM endpoint.
+    A slot is held until the response body has been fully read or closed, so
+    streamed completions count against the limit for their whole duration.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, max_in_flight: int):
+        self._transport = transport
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        queued = time.perf_counter()
+        await self._semaphore.acquire()
+        started = time.perf_counter()
+        STAGE_LATENCY.labels("llm", "queue").observe(started - queued)
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            self._semaphore.release()
+            raise
+        STAGE_LATENCY.labels("llm", "response_headers").observe(time.perf_counter() - started)
+        response.stream = _ReleasingStream(response.stream, self._semaphore.release, started)
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of chat models. Every model shares one pair of
+    keep-alive HTTP clients, so requests reuse pooled TLS connections to the
+    endpoint instead of paying client setup and a handshake per request.
+    """
+
+    def __init__(self, llm_settings: LLMSettings):
+        self.settings = llm_settings
+        self._models: Dict[Tuple[str, float, int], ChatOpenAI] = {}
+        self._lock = threading.Lock()
+
+        limits = httpx.Limits(
+            max_connections=llm_settings.max_connections,
+            max_keepalive_connections=llm_settings.max_keepalive_connections,
+            keepalive_expiry=llm_settings.keepalive_expiry
         )
-        
-    def get_openai_model(self):
-        return self.openai_model
\ No newline at end of file
+        self.timeout = httpx.Timeout(llm_settings.request_timeout, connect=llm_settings.connect_timeout)
+        self.http_client = httpx.Client(limits=limits, timeout=self.timeout)
+        self.http_async_client = httpx.AsyncClient(
+            transport=LimitedAsyncTransport(
+                httpx.AsyncHTTPTransport(limits=limits),
+                llm_settings.max_in_flight
+            ),
+            timeout=self.timeout
+        )
+
+    def get_model(
+        self,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_retries: Optional[int] = None
+    ) -> ChatOpenAI:
+        """
+        Return the shared client for a model, creating it on first use.
+        Pass `max_retries=0` when the caller schedules its own retries.
+        """
+        model = model or self.settings.model
+        temperature = self.settings.temperature if temperature is None else temperature
+        max_retries = self.settings.max_retries if max_retries is None else max_retries
+        key = (model, temperature, max_retries)
+
+        with self._lock:
+            if key not in self._models:
+                self._models[key] = ChatOpenAI(
+                    api_key=self.settings.token,
+                    model=model,
+                    base_url=self.settings.endpoint,
+                    temperature=temperature,
+                    timeout=self.timeout,
+                    max_retries=max_retries,
+                    http_client=self.http_client,
+                    http_async_client=self.http_async_client,
+                    # Token usage and TTFT are recorded for every call; see utils/usage.py
+                    callbacks=[usage_handler],
+                    stream_usage=True
+                )
+            return self._models[key]
+
+    async def aclose(self):
+        """Close the pooled HTTP clients; called on application shutdown"""
+        self.http_client.close()
+        await self.http_async_client.aclose()
+
+
+model_registry = ModelRegistry(settings.llm)
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with the default model's tokenizer, estimating if it is unavailable"""
+    try:
+        return model_registry.get_model().get_num_tokens(text)
+    except Exception:
+        return max(1, len(text) // 4)
+
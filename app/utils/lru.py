@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from utils.metrics import CACHE_ENTRIES, CACHE_EVICTIONS, CACHE_EXPIRATIONS
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """
+    Size-bounded LRU cache whose entries can also expire after a TTL.
+
+    Entries expire `ttl` seconds after they were stored, or after the
+    per-entry TTL passed to `set`. With `idle=True` the expiry is pushed back
+    on every read, which bounds how long an unused entry is kept instead.
+    Expired entries are dropped on lookup and by `purge_expired` (see
+    CachePurger). Hit, miss and eviction counts are kept for `stats`; caches
+    with a `name` also export their size, evictions and expirations to
+    Prometheus.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None, idle: bool = False, name: Optional[str] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.idle = idle
+        self.name = name
+        self._data: "OrderedDict[Hashable, Tuple[Optional[float], Optional[float], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _expires_at(self, ttl: Optional[float]) -> Optional[float]:
+        return time.monotonic() + ttl if ttl is not None else None
+
+    def _removed(self, evicted: int = 0, expired: int = 0):
+        """Count removals and refresh the size gauge; called with the lock held"""
+        self.evictions += evicted
+        self.expirations += expired
+        if self.name is not None:
+            if evicted:
+                CACHE_EVICTIONS.labels(self.name).inc(evicted)
+            if expired:
+                CACHE_EXPIRATIONS.labels(self.name).inc(expired)
+            CACHE_ENTRIES.labels(self.name).set(len(self._data))
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, ttl, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self._removed(expired=1)
+                self.misses += 1
+                return default
+            if self.idle and ttl is not None:
+                self._data[key] = (self._expires_at(ttl), ttl, value)
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._data[key] = (self._expires_at(ttl), ttl, value)
+            self._data.move_to_end(key)
+            evicted = 0
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                evicted += 1
+            self._removed(evicted=evicted)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, None)
+            self._removed()
+            return default if entry is None else entry[2]
+
+    def purge_expired(self) -> int:
+        """Drop every expired entry and return how many were removed"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, (expires_at, _, _) in self._data.items()
+                       if expires_at is not None and expires_at <= now]
+            for key in expired:
+                del self._data[key]
+            self._removed(expired=len(expired))
+            return len(expired)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._removed()
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and (entry[0] is None or entry[0] > time.monotonic())
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
+
+
+class CachePurger:
+    """
+    Background task that purges expired entries from a set of caches every
+    `interval` seconds, so idle entries are released and size metrics stay
+    accurate even for keys that are never looked up again.
+    """
+
+    def __init__(self, caches: List[LRUCache], interval: float):
+        self.caches = caches
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            for cache in self.caches:
+                removed = cache.purge_expired()
+                if removed:
+                    logger.debug(f"Purged {removed} expired entries from the {cache.name or 'unnamed'} cache")
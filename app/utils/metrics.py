@@ -0,0 +1,108 @@
+import functools
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+# Latency buckets from 5ms to 2 minutes, to cover both cache lookups and LLM calls
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time until the response starts, by route template",
+    ["method", "route", "status"],
+    buckets=BUCKETS
+)
+
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "Requests currently being handled",
+    multiprocess_mode="livesum"
+)
+
+STAGE_LATENCY = Histogram(
+    "stage_duration_seconds",
+    "Time spent in one stage of a request: auth, redis, firestore, pdf or llm",
+    ["stage", "operation"],
+    buckets=BUCKETS
+)
+
+LLM_TOKENS = Counter(
+    "llm_tokens_total",
+    "Tokens sent to and generated by the LLM",
+    ["model", "route", "kind"]
+)
+
+LLM_LATENCY = Histogram(
+    "llm_call_duration_seconds",
+    "Duration of one LLM call as seen by LangChain",
+    ["model", "route"],
+    buckets=BUCKETS
+)
+
+LLM_TIME_TO_FIRST_TOKEN = Histogram(
+    "llm_time_to_first_token_seconds",
+    "Time until a streamed LLM call produced its first token",
+    ["model", "route"],
+    buckets=BUCKETS
+)
+
+CACHE_ENTRIES = Gauge(
+    "cache_entries",
+    "Entries held in a per-worker in-memory cache, expired ones included until purged",
+    ["cache"],
+    multiprocess_mode="livesum"
+)
+
+CACHE_EVICTIONS = Counter(
+    "cache_evictions_total",
+    "Entries dropped from a per-worker cache to stay within its size",
+    ["cache"]
+)
+
+CACHE_EXPIRATIONS = Counter(
+    "cache_expirations_total",
+    "Entries dropped from a per-worker cache because their TTL ran out",
+    ["cache"]
+)
+
+
+@contextmanager
+def timed(stage: str, operation: str) -> Iterator[None]:
+    """Record how long the body takes under `stage_duration_seconds`"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(stage, operation).observe(time.perf_counter() - start)
+
+
+def timed_async(stage: str, operation: Optional[str] = None):
+    """Decorator form of `timed` for coroutine functions; the operation defaults to the function name"""
+    def decorator(func):
+        name = operation or func.__name__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with timed(stage, name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def metrics_response_body() -> bytes:
+    """
+    Current metrics in the Prometheus text format. When several workers
+    share PROMETHEUS_MULTIPROC_DIR, the metrics of all of them are merged.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
+
+
+METRICS_CONTENT_TYPE = CONTENT_TYPE_LATEST
@@ -0,0 +1,158 @@
+import asyncio
+import io
+import multiprocessing
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, List, Optional, Set, Tuple, Union
+
+from PyPDF2 import PdfReader
+from config.settings import get_settings
+from utils.metrics import STAGE_LATENCY, timed_async
+
+settings = get_settings()
+
+# A PDF is passed to the workers either as raw bytes or as a path on disk
+PdfSource = Union[bytes, str]
+
+
+class PdfPool:
+    """
+    Worker processes for one PDF. Each request gets its own pool, so a parse
+    that hangs is killed with `terminate` without touching the extractions
+    of other requests.
+    """
+
+    def __init__(self, processes: int):
+        self._pool = multiprocessing.Pool(processes=processes)
+        # Tasks a worker has not finished yet; cancelling a future does not stop its task
+        self._running = 0
+        self._closed = False
+
+    def submit(self, fn: Callable, *args) -> asyncio.Future:
+        """Run `fn(*args)` in a worker; the result is delivered on the running loop"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve(result):
+            loop.call_soon_threadsafe(self._settle, future, result, None)
+
+        def reject(error):
+            loop.call_soon_threadsafe(self._settle, future, None, error)
+
+        self._running += 1
+        self._pool.apply_async(fn, args, callback=resolve, error_callback=reject)
+        return future
+
+    def _settle(self, future: asyncio.Future, result, error: Optional[BaseException]):
+        self._running -= 1
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    async def aclose(self, terminate: bool = False):
+        """
+        Let the workers exit once idle, or kill them if `terminate` is set or
+        a task is still running; either way the processes are reaped
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if terminate or self._running:
+            await asyncio.to_thread(self._pool.terminate)
+        else:
+            self._pool.close()
+        await asyncio.to_thread(self._pool.join)
+
+
+_pools: Set[PdfPool] = set()
+_jobs: Optional[asyncio.Semaphore] = None
+
+
+@asynccontextmanager
+async def pdf_pool(tasks: int) -> AsyncIterator[PdfPool]:
+    """
+    A pool of at most `pdf_workers` processes for one PDF; at most
+    `pdf_max_jobs` of these exist at once across requests. The pool is killed
+    if it is left with tasks still running, e.g. after a timeout.
+    """
+    global _jobs
+    if _jobs is None:
+        _jobs = asyncio.Semaphore(settings.summarizer.pdf_max_jobs)
+    async with _jobs:
+        pool = PdfPool(max(1, min(settings.summarizer.pdf_workers, tasks)))
+        _pools.add(pool)
+        try:
+            yield pool
+        finally:
+            _pools.discard(pool)
+            await pool.aclose()
+
+
+async def shutdown_pdf_pools():
+    """Kill the workers of every PDF still being parsed; called on application shutdown"""
+    await asyncio.gather(*(pool.aclose(terminate=True) for pool in list(_pools)))
+    _pools.clear()
+
+
+def _open_reader(source: PdfSource) -> PdfReader:
+    return PdfReader(io.BytesIO(source) if isinstance(source, bytes) else source)
+
+
+def _count_pages(source: PdfSource) -> int:
+    return len(_open_reader(source).pages)
+
+
+def _extract_page_range(source: PdfSource, start: int, end: int) -> List[str]:
+    reader = _open_reader(source)
+    return [reader.pages[index].extract_text() or "" for index in range(start, end)]
+
+
+@timed_async("pdf", "count_pages")
+async def count_pdf_pages(source: PdfSource) -> int:
+    """Count the pages of a PDF without blocking the event loop"""
+    async with pdf_pool(1) as pool:
+        try:
+            return await asyncio.wait_for(
+                pool.submit(_count_pages, source),
+                timeout=settings.summarizer.pdf_extract_timeout
+            )
+        except asyncio.TimeoutError:
+            raise TimeoutError(
+                f"PDF parsing exceeded {settings.summarizer.pdf_extract_timeout}s"
+            )
+
+
+async def iter_pdf_pages(source: PdfSource, page_count: int) -> AsyncIterator[Tuple[int, str]]:
+    """
+    Extract text from the first `page_count` pages, yielding `(page, text)` in
+    page order. Page ranges are extracted in parallel in this request's own
+    worker pool, and the whole extraction is bounded by the configured
+    timeout, after which the pool is killed (see `pdf_pool`). The time spent
+    waiting on the workers is recorded as the `pdf/extract_pages` stage.
+    """
+    loop = asyncio.get_running_loop()
+    timeout = settings.summarizer.pdf_extract_timeout
+    step = max(1, settings.summarizer.pdf_pages_per_task)
+    ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+
+    async with pdf_pool(len(ranges)) as pool:
+        deadline = loop.time() + timeout
+        futures = [pool.submit(_extract_page_range, source, start, end) for start, end in ranges]
+        waited = 0.0
+        try:
+            for (start, _), future in zip(ranges, futures):
+                wait_start = loop.time()
+                try:
+                    texts = await asyncio.wait_for(future, timeout=max(deadline - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    raise TimeoutError(f"PDF text extraction exceeded {timeout}s")
+                finally:
+                    waited += loop.time() - wait_start
+                for offset, text in enumerate(texts):
+                    yield start + offset, text
+        finally:
+            STAGE_LATENCY.labels("pdf", "extract_pages").observe(waited)
+            for future in futures:
+                future.cancel()
@@ -0,0 +1,30 @@
+from redis.asyncio import ConnectionPool, Redis
+from redis.asyncio.retry import Retry
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import ConnectionError, TimeoutError
+from config.settings import RedisSettings
+
+
+def create_redis_client(redis_settings: RedisSettings) -> Redis:
+    """
+    Build an asyncio Redis client backed by a shared connection pool.
+
+    Connections are health-checked when they have been idle longer than
+    `health_check_interval`, and dropped connections are re-established with
+    exponential backoff instead of failing the request.
+    """
+    pool = ConnectionPool(
+        host=redis_settings.host,
+        port=redis_settings.port,
+        db=redis_settings.db,
+        password=redis_settings.password,
+        max_connections=redis_settings.max_connections,
+        socket_timeout=redis_settings.socket_timeout,
+        socket_connect_timeout=redis_settings.socket_connect_timeout,
+        socket_keepalive=True,
+        health_check_interval=redis_settings.health_check_interval,
+        retry_on_timeout=True,
+        retry=Retry(ExponentialBackoff(), redis_settings.retry_attempts),
+        retry_on_error=[ConnectionError, TimeoutError],
+    )
+    return Redis(connection_pool=pool)
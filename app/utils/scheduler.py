@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+import openai
+
+logger = logging.getLogger(__name__)
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    return getattr(error, "status_code", None)
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """Whether the provider rejected the call for exceeding its rate limits"""
+    return isinstance(error, openai.RateLimitError) or _status_code(error) == 429
+
+
+def is_retryable(error: Exception) -> bool:
+    """Rate limits, server errors, timeouts and dropped connections are retried"""
+    if is_rate_limited(error) or isinstance(error, openai.APIConnectionError):
+        return True
+    code = _status_code(error)
+    return code is not None and code >= 500
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveScheduler:
+    """
+    Runs LLM calls with bounded concurrency that adapts to the endpoint.
+
+    Concurrency grows by one after a window of healthy calls and halves when
+    the provider answers 429 or latency spikes above `latency_spike_factor`
+    times its moving average (AIMD). Calls that were already in flight at the
+    last decrease belong to the same congestion event and do not halve it
+    again. Failed calls are retried with full-jitter exponential backoff,
+    honouring `Retry-After` when the provider sends it.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        min_concurrency: int = 1,
+        max_retries: int = 3,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+        latency_spike_factor: float = 3.0
+    ):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = max(1, min(min_concurrency, max_concurrency))
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.latency_spike_factor = latency_spike_factor
+
+        self.limit = max_concurrency
+        self._active = 0
+        self._healthy_calls = 0
+        self._latency_avg: Optional[float] = None
+        self._last_decrease = float("-inf")
+        self._condition = asyncio.Condition()
+
+    async def _acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._active < self.limit)
+            self._active += 1
+
+    async def _release(self):
+        async with self._condition:
+            self._active -= 1
+            # One slot was freed, so one waiter can proceed
+            self._condition.notify()
+
+    def _decrease(self, started: float, reason: str):
+        """Halve the limit, unless the call started before the last decrease"""
+        if started < self._last_decrease:
+            return
+        new_limit = max(self.min_concurrency, self.limit // 2)
+        if new_limit != self.limit:
+            logger.warning(f"Reducing LLM concurrency from {self.limit} to {new_limit}: {reason}")
+        self.limit = new_limit
+        self._healthy_calls = 0
+        self._last_decrease = time.monotonic()
+
+    async def _record_success(self, started: float, latency: float):
+        if self._latency_avg is not None and latency > self.latency_spike_factor * self._latency_avg:
+            self._decrease(started, f"latency spike ({latency:.1f}s vs {self._latency_avg:.1f}s average)")
+        else:
+            self._healthy_calls += 1
+            if self._healthy_calls >= self.limit and self.limit < self.max_concurrency:
+                self.limit += 1
+                self._healthy_calls = 0
+                async with self._condition:
+                    self._condition.notify()
+
+        if self._latency_avg is None:
+            self._latency_avg = latency
+        else:
+            self._latency_avg = 0.8 * self._latency_avg + 0.2 * latency
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def run(self, func: Callable[..., Awaitable[Any]], *args) -> Any:
+        """Run one call under the concurrency limit, retrying transient failures"""
+        attempt = 0
+        while True:
+            await self._acquire()
+            started = time.monotonic()
+            try:
+                result = await func(*args)
+            except Exception as e:
+                await self._release()
+                if is_rate_limited(e):
+                    self._decrease(started, "rate limited by provider")
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = self._backoff(attempt, e)
+                attempt += 1
+                logger.info(f"Retrying LLM call in {delay:.1f}s (attempt {attempt}/{self.max_retries}): {str(e)}")
+                await asyncio.sleep(delay)
+                continue
+            await self._release()
+            await self._record_success(started, time.monotonic() - started)
+            return result
+
+    async def map(self, func: Callable[[Any], Awaitable[Any]], items: List[Any]) -> AsyncIterator[Tuple[int, Any]]:
+        """
+        Run `func` over `items`, yielding `(index, result)` as calls complete.
+        Callers use the index to keep results in input order. Items are fed
+        to at most `max_concurrency` workers, so a large input does not
+        create one waiting task per item.
+        """
+        pending = iter(enumerate(items))
+        results: asyncio.Queue = asyncio.Queue()
+
+        async def worker():
+            for index, item in pending:
+                try:
+                    results.put_nowait((index, await self.run(func, item), None))
+                except Exception as e:
+                    results.put_nowait((index, None, e))
+                    return
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(min(self.max_concurrency, len(items)))]
+        try:
+            for _ in range(len(items)):
+                index, result, error = await results.get()
+                if error is not None:
+                    raise error
+                yield index, result
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
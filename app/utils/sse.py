@@ -0,0 +1,45 @@
+import asyncio
+import json
+from typing import Any, AsyncIterator, Optional
+
+# Headers that stop proxies from buffering or caching an event stream
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+}
+
+
+def format_sse(data: Any, event: Optional[str] = None) -> str:
+    """Encode a payload as a single Server-Sent Events message"""
+    message = ""
+    if event:
+        message += f"event: {event}\n"
+    message += f"data: {json.dumps(data)}\n\n"
+    return message
+
+
+async def with_heartbeat(events: AsyncIterator[str], interval: float) -> AsyncIterator[str]:
+    """
+    Re-yield an SSE stream, inserting a comment line whenever it has been idle
+    for `interval` seconds so proxies do not time out slow requests.
+    """
+    iterator = events.__aiter__()
+    pending = asyncio.ensure_future(iterator.__anext__())
+    try:
+        while True:
+            done, _ = await asyncio.wait({pending}, timeout=interval)
+            if not done:
+                yield ": keep-alive\n\n"
+                continue
+            try:
+                message = pending.result()
+            except StopAsyncIteration:
+                break
+            yield message
+            pending = asyncio.ensure_future(iterator.__anext__())
+    finally:
+        if not pending.done():
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+        await iterator.aclose()
@@ -0,0 +1,89 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from typing import BinaryIO, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from config.settings import get_settings
+
+settings = get_settings()
+
+
+class SpooledUpload:
+    """
+    An upload as spooled by the multipart parser, with its size and SHA-256
+    digest. The parser's temp file is read in place; `materialize` copies it
+    to a named file only for readers in other processes.
+    """
+
+    def __init__(self, file: UploadFile, size: int, digest: str):
+        self.file = file
+        self.size = size
+        self.digest = digest
+        self.content_type = file.content_type
+        self.path: Optional[str] = None
+
+    def read_text(self, encoding: str = "utf-8") -> str:
+        self.file.file.seek(0)
+        return self.file.file.read().decode(encoding)
+
+    def materialize(self) -> str:
+        """
+        Path of a named copy of the upload, e.g. for the PDF worker processes.
+        The copy outlives the request's form, so streamed responses can keep
+        reading it; remove it with `close`.
+        """
+        if self.path is None:
+            self.file.file.seek(0)
+            with tempfile.NamedTemporaryFile(prefix="upload-", dir=settings.summarizer.upload_tmp_dir, delete=False) as tmp:
+                self.path = tmp.name
+                shutil.copyfileobj(self.file.file, tmp, settings.summarizer.upload_block_size)
+        return self.path
+
+    def close(self):
+        """Remove the named copy, if any; safe to call more than once"""
+        if self.path is None:
+            return
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def too_large(size: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Upload of {size} bytes exceeds the limit of {settings.summarizer.upload_max_bytes} bytes."
+    )
+
+
+def _hash_file(file: BinaryIO) -> Tuple[int, str]:
+    max_bytes = settings.summarizer.upload_max_bytes
+    hasher = hashlib.sha256()
+    size = 0
+    file.seek(0)
+    while True:
+        block = file.read(settings.summarizer.upload_block_size)
+        if not block:
+            break
+        size += len(block)
+        if size > max_bytes:
+            raise too_large(size)
+        hasher.update(block)
+    file.seek(0)
+    return size, hasher.hexdigest()
+
+
+async def spool_upload(file: UploadFile) -> SpooledUpload:
+    """
+    Hash an upload in fixed-size blocks straight from the multipart parser's
+    temp file, so it is neither held in memory nor copied. Request bodies
+    over the limit are already refused before parsing (see
+    `middleware.upload_limit`); this check covers the file part itself.
+    """
+    if file.size is not None and file.size > settings.summarizer.upload_max_bytes:
+        raise too_large(file.size)
+    size, digest = await run_in_threadpool(_hash_file, file.file)
+    return SpooledUpload(file, size, digest)
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.outputs import LLMResult
+from redis.exceptions import RedisError
+from config.settings import get_settings
+from utils.cache_keys import llm_usage_key
+from utils.metrics import LLM_LATENCY, LLM_TIME_TO_FIRST_TOKEN, LLM_TOKENS
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+# Counters kept per (user, model, route) and day
+USAGE_FIELDS = [
+    "requests", "errors", "prompt_tokens", "completion_tokens",
+    "latency_sum", "ttft_sum", "ttft_count", "cost"
+]
+
+UsageKey = Tuple[str, str, str, str]
+
+
+def usage_config(user_id: str, route: str) -> Dict[str, Any]:
+    """Run config that attributes the LLM calls of one invocation to a user and route"""
+    return {"metadata": {"user_id": user_id, "route": route}}
+
+
+def estimate_tokens(chars: int) -> int:
+    """Rough token count for calls whose response carries no usage"""
+    return max(1, chars // 4)
+
+
+def token_usage(response: LLMResult) -> Optional[Tuple[int, int]]:
+    """`(prompt_tokens, completion_tokens)` reported by the endpoint, if any"""
+    usage = (response.llm_output or {}).get("token_usage")
+    if usage:
+        return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    # Streamed responses carry the usage on the final message instead
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if metadata:
+                return metadata.get("input_tokens", 0), metadata.get("output_tokens", 0)
+    return None
+
+
+class UsageRecorder:
+    """
+    In-memory aggregate of LLM usage, added to per-user, per-day Redis hashes
+    every `flush_interval` seconds. Counters that fail to flush are kept and
+    retried with the next flush.
+    """
+
+    def __init__(self, flush_interval: float, retention_days: int):
+        self.flush_interval = flush_interval
+        self.retention = retention_days * 24 * 3600
+        self.redis = None
+        self._pending: Dict[UsageKey, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, redis):
+        self.redis = redis
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop and write whatever is still pending"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.redis is not None:
+            await self.flush()
+
+    def record(self, user_id: str, model: str, route: str, **values: float):
+        day = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        counters = self._pending[(user_id, day, model, route)]
+        for name, value in values.items():
+            counters[name] += value
+
+    async def flush(self) -> bool:
+        """Add pending counters to Redis; returns False if they were kept for a retry"""
+        if not self._pending:
+            return True
+        pending, self._pending = self._pending, defaultdict(lambda: defaultdict(float))
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for (user_id, day, model, route), counters in pending.items():
+                    key = llm_usage_key(user_id, day)
+                    for name, value in counters.items():
+                        pipe.hincrbyfloat(key, f"{model}|{route}|{name}", value)
+                    pipe.expire(key, self.retention)
+                await pipe.execute()
+            return True
+        except RedisError as e:
+            logger.warning(f"Failed to flush LLM usage, will retry: {str(e)}")
+            for key, counters in pending.items():
+                for name, value in counters.items():
+                    self._pending[key][name] += value
+            return False
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+
+class UsageCallbackHandler(AsyncCallbackHandler):
+    """
+    Records tokens, latency and time to first token of every chat model
+    call. The user and route come from the `user_id` and `route` run
+    metadata (see `usage_config`); calls without them are recorded as
+    "anonymous" and "unknown". Totals also feed the Prometheus metrics.
+    """
+
+    def __init__(self, recorder: UsageRecorder):
+        self.recorder = recorder
+        self._runs: Dict[UUID, Dict[str, Any]] = {}
+
+    async def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: List[List[Any]],
+        *,
+        run_id: UUID,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any
+    ):
+        metadata = metadata or {}
+        self._runs[run_id] = {
+            "started": time.perf_counter(),
+            "first_token": None,
+            "user_id": metadata.get("user_id", "anonymous"),
+            "route": metadata.get("route", "unknown"),
+            "model": metadata.get("ls_model_name") or (serialized.get("kwargs") or {}).get("model_name", "unknown"),
+            "prompt_chars": sum(len(str(message.content)) for batch in messages for message in batch)
+        }
+
+    async def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any):
+        run = self._runs.get(run_id)
+        if run is not None and run["first_token"] is None:
+            run["first_token"] = time.perf_counter()
+
+    async def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        latency = time.perf_counter() - run["started"]
+        model = (response.llm_output or {}).get("model_name") or run["model"]
+
+        usage = token_usage(response)
+        if usage is None:
+            completion = "".join(generation.text for generations in response.generations for generation in generations)
+            usage = (estimate_tokens(run["prompt_chars"]), estimate_tokens(len(completion)))
+        prompt_tokens, completion_tokens = usage
+        cost = (
+            prompt_tokens * settings.usage.prompt_cost_per_1k
+            + completion_tokens * settings.usage.completion_cost_per_1k
+        ) / 1000
+
+        values = {
+            "requests": 1,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "latency_sum": latency,
+            "cost": cost
+        }
+        if run["first_token"] is not None:
+            ttft = run["first_token"] - run["started"]
+            values.update(ttft_sum=ttft, ttft_count=1)
+            LLM_TIME_TO_FIRST_TOKEN.labels(model, run["route"]).observe(ttft)
+        self.recorder.record(run["user_id"], model, run["route"], **values)
+
+        LLM_LATENCY.labels(model, run["route"]).observe(latency)
+        LLM_TOKENS.labels(model, run["route"], "prompt").inc(prompt_tokens)
+        LLM_TOKENS.labels(model, run["route"], "completion").inc(completion_tokens)
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        run = self._runs.pop(run_id, None)
+        if run is not None:
+            self.recorder.record(run["user_id"], run["model"], run["route"], errors=1)
+
+
+usage_recorder = UsageRecorder(
+    flush_interval=settings.usage.flush_interval,
+    retention_days=settings.usage.retention_days
+)
+usage_handler = UsageCallbackHandler(usage_recorder)